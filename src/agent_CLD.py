@@ -5,8 +5,8 @@ from datetime import datetime, timedelta
 import os
 import time
 import random
-import re
-from dateutil.parser import parse
+
+from time_phrases import TIME_PHRASES
 
 class ChattyAgent:
     def __init__(self):
@@ -70,43 +70,12 @@ class ChattyAgent:
 
     def parse_time(self, time_str):
         """Parse time string with better error handling"""
-        time_str = time_str.strip().lower()
-        
-        # Try common time formats
-        time_patterns = [
-            r'(\d{1,2}):(\d{2})\s*(am|pm)?',
-            r'(\d{1,2})\s*(am|pm)',
-            r'(\d{1,2})\.(\d{2})'
-        ]
-        
-        for pattern in time_patterns:
-            match = re.search(pattern, time_str)
-            if match:
-                try:
-                    hour = int(match.group(1))
-                    minute = int(match.group(2)) if len(match.groups()) > 1 and match.group(2) else 0
-                    
-                    # Handle AM/PM
-                    if len(match.groups()) > 2 and match.group(3):
-                        if match.group(3) == 'pm' and hour != 12:
-                            hour += 12
-                        elif match.group(3) == 'am' and hour == 12:
-                            hour = 0
-                    
-                    # Validate time
-                    if 0 <= hour <= 23 and 0 <= minute <= 59:
-                        return datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
-                except (ValueError, IndexError):
-                    continue
-        
-        # Try dateutil parser as fallback
-        try:
-            parsed = parse(time_str, fuzzy=True)
-            return parsed.replace(year=datetime.now().year, month=datetime.now().month, day=datetime.now().day)
-        except:
-            pass
-        
-        return None
+        # Regex fast path, then the shared LRU cache, then dateutil (see time_phrases.py)
+        resolved = TIME_PHRASES.resolve(time_str)
+        if resolved is None:
+            return None
+        hour, minute = map(int, resolved.split(":"))
+        return datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
 
     def parse_nlu(self, command):
         """Improved natural language understanding"""
@@ -267,40 +236,37 @@ class ChattyAgent:
                 return f"❌ Task '{task_id}' not found. Use 'list' to see available tasks."
         
         elif nlu_result["action"] == "list":
-            response = "📋 **Your Tasks:**\n\n"
+            # Collect the pieces and join once instead of growing a string in the loops
+            parts = ["📋 **Your Tasks:**\n\n"]
             
             if self.tasks:
-                response += "**Regular Tasks:**\n"
-                for task_id, task in self.tasks.items():
-                    response += f"• {task['desc']} (ID: {task_id})\n"
-                response += "\n"
+                parts.append("**Regular Tasks:**\n")
+                parts.extend(f"• {task['desc']} (ID: {task_id})\n" for task_id, task in self.tasks.items())
+                parts.append("\n")
             
             if self.scheduled_tasks:
-                response += "**Scheduled Tasks:**\n"
+                parts.append("**Scheduled Tasks:**\n")
                 for task_id, task in self.scheduled_tasks.items():
                     time_str = task['time'].strftime("%I:%M %p on %b %d")
                     recurring = " [Daily]" if task['recurring'] else ""
-                    response += f"• {task['desc']} - {time_str}{recurring} (ID: {task_id})\n"
-                response += "\n"
+                    parts.append(f"• {task['desc']} - {time_str}{recurring} (ID: {task_id})\n")
+                parts.append("\n")
             
             if self.completed_tasks:
-                response += f"**Completed Tasks:** {len(self.completed_tasks)} total\n"
+                parts.append(f"**Completed Tasks:** {len(self.completed_tasks)} total\n")
             
             if not self.tasks and not self.scheduled_tasks:
-                response += "No active tasks! Add some with 'add task:description' or 'schedule:description at time'"
+                parts.append("No active tasks! Add some with 'add task:description' or 'schedule:description at time'")
             
-            return response
+            return "".join(parts)
         
         elif nlu_result["action"] == "review":
             if not self.completed_tasks:
                 return "📝 No completed tasks yet!"
             
-            response = "🏆 **Completed Tasks:**\n\n"
-            for task_id, task in self.completed_tasks.items():
-                completed_time = task.get("completed", "Unknown time")
-                response += f"• {task['desc']} - Completed: {completed_time}\n"
-            
-            return response
+            return "🏆 **Completed Tasks:**\n\n" + "".join(
+                f"• {task['desc']} - Completed: {task.get('completed', 'Unknown time')}\n"
+                for task in self.completed_tasks.values())
         
         elif nlu_result["action"] == "clear":
             cleared_count = len(self.tasks) + len(self.scheduled_tasks)
@@ -0,0 +1,79 @@
+# alert_dedup.py
+from datetime import datetime, timedelta
+import heapq
+import time
+
+class AlertDedup:
+    """
+    Remembers which tasks were alerted in the current minute (one-time tasks) or day (recurring tasks).
+    An entry is only useful until its minute or day is over, so each one expires then and is evicted
+    from a min-heap of expiry times; memory tracks recent alerts only, not every task that ever fired.
+    Saved in the old last_notified layout: {timestamp key: {"last_alert_day"/"last_alert_minute": ...}}.
+    """
+    def __init__(self):
+        self._entries = {} # Task timestamp key -> {"last_alert_day": "YYYY-MM-DD", "last_alert_minute": "YYYY-MM-DD HH:MM"}
+        self._expires = {} # Task timestamp key -> epoch the entry stops mattering
+        self._heap = [] # (expires_at, key); entries whose key was marked again later are skipped
+
+    @staticmethod
+    def _expiry(entry):
+        ends = []
+        if "last_alert_day" in entry:
+            ends.append(datetime.strptime(entry["last_alert_day"], "%Y-%m-%d") + timedelta(days=1))
+        if "last_alert_minute" in entry:
+            ends.append(datetime.strptime(entry["last_alert_minute"], "%Y-%m-%d %H:%M") + timedelta(minutes=1))
+        return max(ends).timestamp() if ends else 0
+
+    def alerted(self, key, day=None, minute=None):
+        """True if key was already alerted on this day (recurring) or in this minute (one-time)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if day is not None:
+            return entry.get("last_alert_day") == day
+        return entry.get("last_alert_minute") == minute
+
+    def mark(self, key, day=None, minute=None):
+        entry = self._entries.setdefault(key, {})
+        if day is not None:
+            entry["last_alert_day"] = day
+        if minute is not None:
+            entry["last_alert_minute"] = minute
+        expires_at = self._expiry(entry)
+        self._expires[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, key))
+        self.evict()
+
+    def evict(self, now=None):
+        """Drops entries whose minute/day is over. O(log n) per evicted entry, O(1) when nothing is due."""
+        now = time.time() if now is None else now
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == expires_at:
+                del self._expires[key]
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def to_dict(self):
+        return {key: dict(entry) for key, entry in self._entries.items()}
+
+    def load(self, data):
+        """Restores saved entries, dropping the ones that have already expired."""
+        self._entries.clear()
+        self._expires.clear()
+        self._heap = []
+        for key, entry in (data or {}).items():
+            try:
+                expires_at = self._expiry(entry)
+            except (TypeError, ValueError):
+                continue
+            self._entries[key] = dict(entry)
+            self._expires[key] = expires_at
+            self._heap.append((expires_at, key))
+        heapq.heapify(self._heap)
+        self.evict()
+
+    def clear(self):
+        self.load({})
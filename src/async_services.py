@@ -0,0 +1,376 @@
+# async_services.py
+import asyncio
+from collections import deque
+import concurrent.futures
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from external_services import DEFAULT_BLOG_PROMPT, ERROR_PREFIX, RETRY_STATUSES, EmailClient, ModelWarmth, flight_key, latency_summary
+from config import OLLAMA_API_URL, OLLAMA_MODEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_MAX_CONCURRENT, OLLAMA_KEEP_ALIVE, \
+                   OLLAMA_RETRIES, OLLAMA_RETRY_BACKOFF, EMAIL_SERVER, EMAIL_PORT, EMAIL_TO, EMAIL_TIMEOUT, EMAIL_IDLE_TIMEOUT, EMAIL_MAX_CONCURRENT
+
+class OllamaHTTPError(Exception):
+    pass
+
+class AsyncOllamaClient:
+    """
+    asyncio counterpart of OllamaClient: posts to Ollama over asyncio streams (no thread per call), reusing
+    keep-alive connections, and reads the newline-delimited JSON as it arrives. Transient failures are retried
+    and latencies recorded as in OllamaClient. At most max_concurrent generations run at once;
+    the rest wait on a semaphore. Cancelling the calling task closes the connection, which makes
+    Ollama stop generating. Takes the same options and ResponseCache as OllamaClient, and coalesces
+    identical concurrent calls the same way: they share one generation, which runs as its own task and is
+    only cancelled once every caller waiting on it has been. keep_alive, warm_up and keep-warm work as in OllamaClient.
+    """
+    def __init__(self, api_url=OLLAMA_API_URL, model=OLLAMA_MODEL, max_concurrent=OLLAMA_MAX_CONCURRENT,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT, read_timeout=OLLAMA_READ_TIMEOUT, options=None, cache=None,
+                 keep_alive=OLLAMA_KEEP_ALIVE, retries=OLLAMA_RETRIES, retry_backoff=OLLAMA_RETRY_BACKOFF):
+        self.api_url = api_url
+        self.model = model
+        self.options = options
+        self.cache = cache
+        self.coalesced = 0
+        self.keep_alive = keep_alive
+        self.warmth = ModelWarmth(keep_alive)
+        self._flights = {} # flight_key -> (task, pieces streamed so far, listeners, [callers waiting])
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.latencies = deque(maxlen=200) # Seconds per request, until the stream ends
+        self.pool_size = max_concurrent + 1 # Idle keep-alive connections kept (one more for warm-ups)
+        self._idle = [] # (reader, writer) of keep-alive connections whose last response was read to the end
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def _connect(self):
+        url = urlsplit(self.api_url)
+        secure = url.scheme == "https"
+        port = url.port or (443 if secure else 80)
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(url.hostname, port, ssl=secure or None), self.connect_timeout)
+        except asyncio.TimeoutError as e:
+            raise ConnectionError(f"connecting to {url.netloc} timed out after {self.connect_timeout}s") from e
+
+    def _release(self, reader, writer, reusable):
+        """Returns a connection whose response was read to the end to the idle pool; closes anything else."""
+        if reusable and not writer.is_closing() and not reader.at_eof() and len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _send(self, reader, writer, payload):
+        """Writes the POST and reads the status line and headers; returns (status, reason, headers)."""
+        url = urlsplit(self.api_url)
+        body = json.dumps(payload).encode()
+        writer.write(f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body) # HTTP/1.1 keeps the connection open by default
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+        if not status_line:
+            raise ConnectionResetError("connection closed by the server")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise OllamaHTTPError(f"bad status line {status_line!r}")
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return int(parts[1]), parts[2].decode("latin-1").strip() if len(parts) > 2 else "", headers
+
+    async def _request(self, payload):
+        """
+        Sends the POST on an idle keep-alive connection if there is one, else a new one; returns
+        (reader, writer, framing, keep_alive) for a 2xx response, framing being "chunked", a Content-Length or None.
+        Retries like OllamaClient: connection errors (including connect timeouts) and 5xx responses, with jittered
+        exponential backoff; a read timeout is not retried. A pooled connection the server has closed in the
+        meantime is replaced without counting as an attempt.
+        """
+        attempt = 0
+        while True:
+            reader = writer = None
+            reused = bool(self._idle)
+            try:
+                reader, writer = self._idle.pop() if reused else await self._connect()
+                status, reason, headers = await self._send(reader, writer, payload)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                if writer is not None:
+                    writer.close()
+                if reused:
+                    continue
+                if attempt == self.retries:
+                    raise
+                print(f"Ollama request failed ({str(e) or type(e).__name__}); retrying ({attempt + 1}/{self.retries}).")
+            except BaseException:
+                if writer is not None:
+                    writer.close()
+                raise
+            else:
+                if status not in RETRY_STATUSES or attempt == self.retries:
+                    if status >= 400:
+                        writer.close()
+                        raise OllamaHTTPError(f"{status} {reason}".strip())
+                    if "chunked" in headers.get("transfer-encoding", "").lower():
+                        framing = "chunked"
+                    elif headers.get("content-length", "").isdigit():
+                        framing = int(headers["content-length"])
+                    else:
+                        framing = None # Body runs until the server closes the connection
+                    return reader, writer, framing, headers.get("connection", "").lower() != "close"
+                writer.close() # Not worth reading an error body just to reuse the connection
+                print(f"Ollama answered {status}; retrying ({attempt + 1}/{self.retries}).")
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt)) # Full jitter
+            attempt += 1
+
+    async def _body(self, reader, framing):
+        """Yields the raw body as it arrives, undoing chunked transfer encoding, and stops at its end."""
+        if framing == "chunked":
+            while True:
+                size = int((await asyncio.wait_for(reader.readline(), self.read_timeout)).split(b";")[0], 16)
+                if size == 0:
+                    while await asyncio.wait_for(reader.readline(), self.read_timeout) not in (b"\r\n", b"\n", b""):
+                        pass # Trailers
+                    return
+                data = await asyncio.wait_for(reader.readexactly(size + 2), self.read_timeout) # Data plus CRLF
+                yield data[:-2]
+        elif framing is None:
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), self.read_timeout)
+                if not data:
+                    return
+                yield data
+        else:
+            remaining = framing
+            while remaining:
+                data = await asyncio.wait_for(reader.read(min(65536, remaining)), self.read_timeout)
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+
+    def latency_stats(self):
+        """Count, mean, median, 95th percentile and max of the recorded request latencies, in seconds."""
+        return latency_summary(self.latencies)
+
+    def _payload(self, prompt, stream):
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if self.options:
+            payload["options"] = self.options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    async def warm_up(self):
+        """Loads the model without generating anything; returns True if it worked."""
+        writer = None
+        reusable = False
+        try:
+            start = time.perf_counter()
+            reader, writer, framing, keep_alive = await self._request(self._payload("", False))
+            body = b"".join([data async for data in self._body(reader, framing)])
+            reusable = keep_alive and framing is not None
+            self.warmth.record(time.perf_counter() - start, json.loads(body).get("load_duration"), generation=False)
+            return True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, OllamaHTTPError, ValueError) as e:
+            print(f"Could not warm up {self.model}: {str(e) or type(e).__name__}")
+            return False
+        finally:
+            if writer is not None:
+                self._release(reader, writer, reusable)
+
+    async def keep_warm_until(self, when):
+        """
+        For a generation expected at time.monotonic() value `when`: if keep_alive would have unloaded the
+        model by then, waits until warmth.warm_up_lead() seconds before it and warms the model up. Returns once that is done.
+        """
+        if self.warmth.loaded_at(when):
+            return
+        delay = when - self.warmth.warm_up_lead() - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not self.warmth.loaded_at(when): # Another request may have loaded it meanwhile
+            await self.warm_up()
+
+    async def stream_blog(self, prompt=DEFAULT_BLOG_PROMPT):
+        """Async generator of the text as Ollama generates it; errors are yielded as an error message."""
+        async with self._semaphore:
+            writer = None
+            reusable = False
+            try:
+                start = time.perf_counter()
+                reader, writer, framing, keep_alive = await self._request(self._payload(prompt, True))
+                pending = b""
+                done = False
+                async for data in self._body(reader, framing):
+                    if done:
+                        continue # Read the end of the body, so the connection can be reused
+                    *lines, pending = (pending + data).split(b"\n")
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            yield f"{ERROR_PREFIX}{chunk['error']}"
+                            return
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            self.latencies.append(time.perf_counter() - start)
+                            self.warmth.record(self.latencies[-1], chunk.get("load_duration"))
+                            done = True
+                            break
+                reusable = done and keep_alive and framing is not None
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, OllamaHTTPError, ValueError) as e:
+                yield f"{ERROR_PREFIX}{str(e) or type(e).__name__}"
+            finally:
+                if writer is not None:
+                    # Pooled only after a complete response; on cancellation it is closed, which stops the generation
+                    self._release(reader, writer, reusable)
+
+    async def generate_blog(self, prompt=DEFAULT_BLOG_PROMPT, on_chunk=None):
+        """
+        Returns the whole generated text; with on_chunk, each piece is passed on as it arrives. A call that
+        joins a generation already in flight first gets the pieces streamed so far.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, self.options) # A small local file read
+            if cached is not None:
+                if on_chunk is not None:
+                    on_chunk(cached)
+                return cached
+        key = flight_key(self.model, prompt, self.options)
+        flight = self._flights.get(key)
+        if flight is None:
+            parts, listeners = [], []
+            task = asyncio.ensure_future(self._generate(prompt, parts, listeners))
+            flight = self._flights[key] = (task, parts, listeners, [0])
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.coalesced += 1
+        task, parts, listeners, waiting = flight
+        if on_chunk is not None:
+            for piece in parts:
+                on_chunk(piece)
+            listeners.append(on_chunk)
+        waiting[0] += 1
+        try:
+            return await asyncio.shield(task) # Cancelling one caller must not cancel the others' generation
+        except asyncio.CancelledError:
+            if on_chunk is not None:
+                listeners.remove(on_chunk)
+            if waiting[0] == 1:
+                task.cancel()
+            raise
+        finally:
+            waiting[0] -= 1
+
+    async def _generate(self, prompt, parts, listeners):
+        async for piece in self.stream_blog(prompt):
+            parts.append(piece)
+            for listener in list(listeners):
+                listener(piece)
+        text = "".join(parts)
+        if self.cache is not None and parts and not parts[-1].startswith(ERROR_PREFIX): # Errors are never cached
+            self.cache.put(self.model, prompt, text, self.options)
+        return text
+
+class AsyncEmailClient:
+    """
+    asyncio counterpart of EmailClient: up to max_concurrent messages are in flight at once, each over one of
+    max_concurrent persistent SMTP sessions (an EmailClient apiece, with its reconnect handling). smtplib blocks,
+    so every send runs in the loop's default executor; the semaphore bounds the sessions and threads in use.
+    """
+    def __init__(self, server=EMAIL_SERVER, port=EMAIL_PORT, max_concurrent=EMAIL_MAX_CONCURRENT,
+                 idle_timeout=EMAIL_IDLE_TIMEOUT, timeout=EMAIL_TIMEOUT):
+        self._sessions = [EmailClient(server, port, idle_timeout, timeout) for _ in range(max_concurrent)]
+        self._idle = list(self._sessions) # Only touched on the event loop
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.last_error = None
+
+    @property
+    def connections(self):
+        return sum(session.connections for session in self._sessions)
+
+    async def deliver(self, subject, body, recipients=EMAIL_TO):
+        """Sends one message; returns None if it was accepted, else the error text (per message, unlike last_error)."""
+        async with self._semaphore:
+            session = self._idle.pop()
+            try:
+                sent = await asyncio.get_running_loop().run_in_executor(None, session.send_email, subject, body, recipients)
+            finally:
+                self._idle.append(session)
+        if sent:
+            return None
+        self.last_error = session.last_error
+        return session.last_error
+
+    async def send_email(self, subject, body, recipients=EMAIL_TO):
+        """Returns True if the message was accepted."""
+        return await self.deliver(subject, body, recipients) is None
+
+    async def send_batch(self, messages):
+        """Sends (subject, body) or (subject, body, recipients) tuples concurrently; returns how many were accepted."""
+        results = await asyncio.gather(*(self.deliver(*message) for message in messages))
+        return sum(1 for error in results if error is None)
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+
+class ServiceLoop:
+    """
+    An asyncio event loop on a daemon thread, next to the pygame loop. submit() schedules a coroutine on it
+    from any thread and returns a concurrent.futures.Future; cancel_all() cancels whatever is still running.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def run(self, coro, timeout=None):
+        """Runs a coroutine on the loop and waits for its result (for calls made from outside the loop)."""
+        return self.submit(coro).result(timeout)
+
+    def pending(self):
+        with self._lock:
+            return len(self._futures)
+
+    def cancel_all(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True) # Let their cleanup (closing connections) run
+        await self.loop.shutdown_asyncgens()
+
+    def stop(self, timeout=5):
+        """Cancels everything still running on the loop and waits for it to unwind before stopping the loop."""
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
+        except concurrent.futures.TimeoutError:
+            print(f"Warning: Async services did not finish cancelling within {timeout}s; stopping anyway.")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
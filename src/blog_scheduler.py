@@ -0,0 +1,84 @@
+# blog_scheduler.py
+import asyncio
+from collections import deque
+import time
+
+class BlogScheduler:
+    """
+    Sends a post every interval seconds on a fixed monotonic cadence (due times are start + k * interval,
+    so lateness never accumulates). Each post is generated ahead of its due time: generation starts
+    `lead` seconds early, where lead is a moving estimate of generation latency times a safety margin,
+    and the finished post waits in a ready slot until it is due. Every send records how late (positive)
+    or early (negative) it went out relative to its due time.
+
+    generate() is a coroutine returning the post's text; send(text, lateness) is a coroutine that
+    delivers it. Both run on the caller's event loop. The optional prepare(start_at) coroutine runs
+    ahead of each generation with the clock time it will start at (e.g. to have the model loaded by then).
+    """
+    def __init__(self, generate, send, interval, initial_estimate=60.0, margin=1.5, smoothing=0.3, clock=time.monotonic, prepare=None):
+        self.generate = generate
+        self.send = send
+        self.prepare = prepare
+        self.interval = interval
+        self.estimate = initial_estimate # Seconds a generation is expected to take (exponential moving average)
+        self.margin = margin
+        self.smoothing = smoothing
+        self.clock = clock
+        self.ready = None # The prefetched post waiting for its due time
+        self.lateness = deque(maxlen=100) # Seconds each send went out after (positive) or before (negative) its due time
+        self.sends = 0
+        self.skipped = 0 # Due times missed entirely because a generation overran a whole interval
+        self.failed = 0 # Due times missed because preparing, generating or sending the post raised
+        self.last_error = None
+
+    def lead(self):
+        """How long before the due time the next generation starts; never more than one interval."""
+        return min(self.interval, self.estimate * self.margin)
+
+    async def _sleep_until(self, deadline):
+        delay = deadline - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run(self):
+        due = self.clock() + self.interval
+        while True:
+            try:
+                await self._post(due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e: # One bad post must not end the cadence
+                self.failed += 1
+                self.last_error = repr(e)
+                self.ready = None
+                print(f"Blog scheduler: a scheduled post failed ({e!r}); keeping the cadence.")
+                await self._sleep_until(due) # An instant failure must not run through the following slots
+            due += self.interval
+            if due + self.interval < self.clock(): # Overran whole intervals: keep the cadence, send the latest missed slot late, drop the rest
+                missed = int((self.clock() - due) // self.interval)
+                self.skipped += missed
+                due += missed * self.interval
+
+    async def _post(self, due):
+        if self.prepare is not None:
+            await self.prepare(due - self.lead())
+        await self._sleep_until(due - self.lead())
+        started = self.clock()
+        self.ready = await self.generate()
+        took = self.clock() - started
+        self.estimate += self.smoothing * (took - self.estimate)
+        await self._sleep_until(due)
+        lateness = self.clock() - due
+        self.lateness.append(lateness)
+        self.sends += 1
+        post, self.ready = self.ready, None
+        await self.send(post, lateness)
+
+    def stats(self):
+        """Sends so far, misses, mean and worst recent lateness in seconds, the current latency estimate and the lead it gives."""
+        result = {"sends": self.sends, "skipped": self.skipped, "failed": self.failed, "last_error": self.last_error,
+                  "estimate": self.estimate, "lead": self.lead()}
+        if self.lateness:
+            result["mean_lateness"] = sum(self.lateness) / len(self.lateness)
+            result["max_lateness"] = max(self.lateness)
+        return result
@@ -1,25 +1,37 @@
 # chatty_agent.py
 import pygame
 import time
-import threading
 from datetime import datetime, timedelta
 
 # Import all necessary components and constants
+from recurrence import RecurrenceRule
 from task_manager import TaskManager
+from task_store import create_task_store
 from nlu_parser import NLUParser
-from external_services import OllamaClient, EmailClient
+from async_services import AsyncEmailClient, AsyncOllamaClient, ServiceLoop
+from blog_scheduler import BlogScheduler
+from response_cache import ResponseCache
+from mail_spool import MailSpool
 from ui_manager import UIManager
-from config import CHECK_INTERVAL, BLOG_INTERVAL, ALERT_SOUND_FILE, BEEP_SOUND_FILE, SCREEN_WIDTH, SCREEN_HEIGHT, TASKS_FILE # Import SCREEN_WIDTH, SCREEN_HEIGHT from config
+from config import CHECK_INTERVAL, LIST_PAGE_SIZE, BLOG_INTERVAL, BLOG_INITIAL_ESTIMATE, BLOG_PREFETCH_MARGIN, ALERT_SOUND_FILE, BEEP_SOUND_FILE, SCREEN_WIDTH, SCREEN_HEIGHT, TASKS_FILE, \
+                   TASK_STORE, TASKS_DB_FILE, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, JOURNAL_FILE, JOURNAL_FSYNC_BATCH, JOURNAL_FSYNC_INTERVAL, \
+                   RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, \
+                   MAIL_SPOOL_DIR, MAIL_MAX_ATTEMPTS, MAIL_RETRY_BACKOFF, OLLAMA_WARM_UP # Import SCREEN_WIDTH, SCREEN_HEIGHT from config
 
 class ChattyAgent:
     def __init__(self):
         pygame.init()  # Ensure Pygame is initialized first
         pygame.mixer.init()  # Explicitly initialize mixer
 
-        self.task_manager = TaskManager()
+        self.task_manager = TaskManager(create_task_store(TASK_STORE, TASKS_DB_FILE, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS))
         self.nlu = NLUParser()
-        self.ollama_client = OllamaClient()
-        self.email_client = EmailClient()
+        # Blog generation and email run as coroutines on their own event loop, so the pygame loop never waits on them
+        self.services = ServiceLoop()
+        self._blog_streams = {} # Prompt (None for the default) -> UI stream of the 'generate blog' in flight; used on the service loop only
+        cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES) if RESPONSE_CACHE_ENABLED else None
+        self.ollama_client = AsyncOllamaClient(cache=cache)
+        # Outbound mail is spooled to disk and delivered (with retries, several messages at once) by the spool's own thread, never by the UI
+        self.mail_spool = MailSpool(MAIL_SPOOL_DIR, AsyncEmailClient(), MAIL_MAX_ATTEMPTS, MAIL_RETRY_BACKOFF, on_event=self._mail_event)
 
         # Initialize Pygame display here, and then pass the screen surface to UIManager
         initial_screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
@@ -40,10 +52,17 @@ class ChattyAgent:
 
         # Load initial state for tasks
         self.task_manager.load_state(TASKS_FILE)
+        # Replay changes journaled since the last snapshot, then journal every change from here on
+        self.task_manager.enable_journal(TASKS_FILE, JOURNAL_FILE, JOURNAL_FSYNC_BATCH, JOURNAL_FSYNC_INTERVAL)
 
-        # Start background blog generation thread
-        blog_thread = threading.Thread(target=self._schedule_blog_generation, daemon=True)
-        blog_thread.start()
+        # Load the model now rather than on the first 'generate blog'
+        if OLLAMA_WARM_UP:
+            self.services.submit(self.ollama_client.warm_up())
+        # Start background blog generation on the service loop: each post is prefetched and sent on a fixed cadence,
+        # and the model is warmed up before a generation if keep_alive would have unloaded it by then
+        self.blog_scheduler = BlogScheduler(self.ollama_client.generate_blog, self._send_scheduled_blog, BLOG_INTERVAL,
+                                            BLOG_INITIAL_ESTIMATE, BLOG_PREFETCH_MARGIN, prepare=self.ollama_client.keep_warm_until)
+        self.services.submit(self.blog_scheduler.run()).add_done_callback(self._scheduler_stopped)
 
         # Initial visualization (draw empty screen + agent)
         self.ui.visualize(self.state) # ui.visualize now takes only state
@@ -55,22 +74,42 @@ class ChattyAgent:
             print(f"Warning: Could not load sound file '{filename}': {e}")
             return None
 
-    def _schedule_blog_generation(self):
-        """Schedules blog generation and email at regular intervals."""
-        while True:
-            # Calculate time to wait until the next interval
-            now = datetime.now()
-            next_interval_time = now + timedelta(seconds=BLOG_INTERVAL)
-            time_to_wait = (next_interval_time - now).total_seconds()
-            if time_to_wait < 0: # If somehow we are behind schedule, just wait for next full interval
-                time_to_wait = 0 # Or could be BLOG_INTERVAL - (abs(time_to_wait) % BLOG_INTERVAL)
+    async def _send_scheduled_blog(self, blog_content, lateness):
+        """Shows and emails a post the scheduler generated ahead of time, with how far off its due time it went out."""
+        self.ui.add_response(f"Blog: {blog_content}")
+        subject = f"Blog Post - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        self.mail_spool.enqueue(subject, blog_content)
+        timing = f"{lateness:.1f}s late" if lateness >= 0.05 else "on time" if lateness > -0.05 else f"{-lateness:.1f}s early"
+        self.ui.add_response(f"Blog generated at {datetime.now().strftime('%H:%M')} and queued for email ({timing})")
+        print(f"Scheduled blog sent {timing}; scheduler stats: {self.blog_scheduler.stats()}; model warmth: {self.ollama_client.warmth.stats()}")
 
-            time.sleep(max(0, time_to_wait)) # Ensure non-negative wait time
+    async def _generate_and_email(self, prompt=None):
+        """Streams a post into the UI as it is generated and spools it for email once the stream has finished; returns the subject."""
+        # A second request for the same post joins the generation in flight (see generate_blog) and its line on screen
+        stream = self._blog_streams.get(prompt)
+        joined = stream is not None
+        if not joined:
+            stream = self._blog_streams[prompt] = self.ui.start_stream("Blog: ")
+        on_chunk = None if joined else lambda text: self.ui.add_response(text, stream=stream)
+        try:
+            if prompt is None:
+                blog_content = await self.ollama_client.generate_blog(on_chunk=on_chunk) # Use default prompt
+            else:
+                blog_content = await self.ollama_client.generate_blog(prompt, on_chunk=on_chunk)
+        finally:
+            if not joined:
+                del self._blog_streams[prompt]
+                self.ui.end_stream(stream)
+        subject = f"Blog Post - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        self.mail_spool.enqueue(subject, blog_content)
+        return subject
 
-            blog_content = self.ollama_client.generate_blog() # Use default prompt or pass a specific one
-            subject = f"Blog Post - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            self.email_client.send_email(subject, blog_content)
-            self.ui.add_response(f"Blog generated and emailed at {datetime.now().strftime('%H:%M')}")
+    def _mail_event(self, kind, message):
+        """Called from the spool's worker thread when a message is delivered or given up on."""
+        if kind == "sent":
+            self.ui.add_response(f"Emailed '{message['subject']}'.")
+        else:
+            self.ui.add_response(f"Couldn’t email '{message['subject']}' after {message['attempts']} tries ({message['last_error']}); it’s kept in {self.mail_spool.dead_directory}.")
 
     def respond(self, command):
         """Processes a user command and returns a response."""
@@ -92,12 +131,17 @@ class ChattyAgent:
         
         elif action == "schedule":
             try:
-                today = datetime.now().date()
-                scheduled_dt_candidate = datetime.strptime(nlu_result["time"], "%H:%M").time()
-                scheduled_datetime = datetime.combine(today, scheduled_dt_candidate)
-                # If scheduled time is in the past for today, schedule for next day
-                if scheduled_datetime < datetime.now():
-                    scheduled_datetime += timedelta(days=1)
+                if nlu_result["time"] is None:
+                    # 'schedule every N minutes:desc' without a start time: first reminder one interval from now
+                    now = datetime.now().replace(second=0, microsecond=0)
+                    scheduled_datetime = datetime.fromtimestamp(RecurrenceRule.parse(nlu_result["recurring"]).next_after(int(now.timestamp()), int(now.timestamp())))
+                else:
+                    today = datetime.now().date()
+                    scheduled_dt_candidate = datetime.strptime(nlu_result["time"], "%H:%M").time()
+                    scheduled_datetime = datetime.combine(today, scheduled_dt_candidate)
+                    # If scheduled time is in the past for today, schedule for next day
+                    if scheduled_datetime < datetime.now():
+                        scheduled_datetime += timedelta(days=1)
                 # TaskManager returns the full response string
                 response_text = self.task_manager.schedule_task(
                     nlu_result["desc"], scheduled_datetime, nlu_result["recurring"], nlu_result["priority"]
@@ -111,19 +155,22 @@ class ChattyAgent:
             response_text = f"Updated priority for '{desc}' at {timestamp} to {nlu_result['priority']}!" if desc else f"No scheduled task found matching '{nlu_result['task_time']}'."
             
         elif action == "feedback":
-            # Explicitly cast to int to help Pylance
-            self.task_manager.feedback_history[nlu_result["suggestion"].lower()] += int(nlu_result["feedback"]) # FIX: Explicit cast to int
+            self.task_manager.record_feedback(nlu_result["suggestion"], nlu_result["feedback"])
             feedback_value_str = "good" if nlu_result["feedback"] == 1 else "bad" if nlu_result["feedback"] == -1 else "neutral"
             response_text = f"Feedback recorded for '{nlu_result['suggestion']}': {feedback_value_str}"
 
         elif action == "generate_blog":
-            blog_content = self.ollama_client.generate_blog()
-            subject = f"Blog Post - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-            self.email_client.send_email(subject, blog_content)
-            # Add detailed blog content to response display
-            self.ui.add_response(f"Generated and emailed blog post: {subject}\n{blog_content[:100]}...") 
+            # Runs on the service loop: the post streams in below and is spooled for email when done, while the UI stays live
+            future = self.services.submit(self._generate_and_email())
+            future.add_done_callback(self._report_blog)
             # Provide a concise response for the input line
-            response_text = "Blog generated and emailed!" 
+            response_text = "Writing a blog post; it will stream in below and be emailed when done."
+
+        elif action == "mail_status":
+            status = self.mail_spool.status()
+            response_text = f"Mail: {status['queued']} queued ({status['retrying']} retrying), {status['sent']} sent this session, {status['dead']} undeliverable."
+            if status["next_retry"] is not None:
+                response_text += f" Next retry at {datetime.fromtimestamp(status['next_retry']).strftime('%H:%M:%S')} (last error: {status['last_error']})."
 
         elif action == "complete":
             # TaskManager returns description and timestamp, ChattyAgent formats response
@@ -131,12 +178,18 @@ class ChattyAgent:
             response_text = f"Great job! Marked '{desc}' ({timestamp}) as complete!" if desc else f"Task '{nlu_result['identifier']}' not found in active or scheduled tasks."
         
         elif action == "review":
-            # TaskManager returns the formatted string
-            response_text = self.task_manager.get_completed_tasks_display()
+            # TaskManager returns the formatted string; large histories are paged
+            if "page" in nlu_result or self.task_manager.task_count(("completed",)) > LIST_PAGE_SIZE:
+                response_text = self.task_manager.get_completed_page(nlu_result.get("page", 1), LIST_PAGE_SIZE)
+            else:
+                response_text = self.task_manager.get_completed_tasks_display()
         
         elif action == "list":
-            # TaskManager returns the formatted string
-            response_text = self.task_manager.get_all_tasks_display()
+            # TaskManager returns the formatted string; large lists are paged
+            if "page" in nlu_result or "due" in nlu_result or self.task_manager.task_count() > LIST_PAGE_SIZE:
+                response_text = self.task_manager.get_tasks_page(nlu_result.get("page", 1), LIST_PAGE_SIZE, nlu_result.get("due") == "today")
+            else:
+                response_text = self.task_manager.get_all_tasks_display()
         
         elif action == "clear":
             self.task_manager.clear_tasks() # TaskManager clears its data
@@ -147,11 +200,29 @@ class ChattyAgent:
             response_text = "Catch you later! Saving my notes..."
         
         elif action == "unknown":
-            response_text = nlu_result.get("message", "Oops! I’m puzzled. Try natural commands like ‘hello’, ‘add task:desc’, ‘schedule task:desc at HH:MM’, ‘schedule recurring:desc at HH:MM’, ‘set priority:TIME to PRIORITY’, ‘feedback:SUGGESTION on LIKE/DISLIKE’, ‘generate blog’, ‘complete task:TIME_OR_DESC’, ‘review completed’, ‘list tasks’, ‘clear tasks’, or ‘exit’.")
+            response_text = nlu_result.get("message", "Oops! I’m puzzled. Try natural commands like ‘hello’, ‘add task:desc’, ‘schedule task:desc at HH:MM’, ‘schedule recurring|weekly|weekdays:desc at HH:MM’, ‘schedule every N minutes:desc’, ‘set priority:TIME to PRIORITY’, ‘feedback:SUGGESTION on LIKE/DISLIKE’, ‘generate blog’, ‘complete task:TIME_OR_DESC’, ‘review completed [page N]’, ‘list tasks [due today] [page N]’, ‘mail status’, ‘clear tasks’, or ‘exit’.")
 
+        if "corrected" in nlu_result: # A near-miss command was routed to the closest known one
+            response_text = f"(Reading that as ‘{nlu_result['corrected']}’) {response_text}"
         self.ui.add_response(response_text) # Add agent's response to UI display
         return response_text
 
+    def _scheduler_stopped(self, future):
+        """run() only returns by being cancelled at shutdown; anything else means scheduled posts have stopped."""
+        if future.cancelled():
+            return
+        error = future.exception()
+        print(f"Blog scheduler stopped: {error!r}" if error is not None else "Blog scheduler stopped.")
+        self.ui.add_response("Scheduled blog posts have stopped; see the log.")
+
+    def _report_blog(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.ui.add_response(f"Blog generation failed: {future.exception()}")
+        else:
+            self.ui.add_response(f"Blog generated and queued for email! ({future.result()})")
+
     def check_scheduled_tasks_and_notify_ui(self):
         """
         Delegates task checking to TaskManager and handles UI alerts/sounds based on results.
@@ -185,6 +256,7 @@ class ChattyAgent:
             current_loop_time = time.time()
             if current_loop_time - self.last_check_time >= CHECK_INTERVAL:
                 self.check_scheduled_tasks_and_notify_ui() # Call the unified method
+                self.task_manager.sync_state() # Flush journal batches / bookkeeping that have waited long enough
                 self.last_check_time = current_loop_time
 
             # Event handling (Pygame events)
@@ -226,6 +298,8 @@ class ChattyAgent:
             pygame.time.delay(50) # Small delay to prevent 100% CPU usage
             self.ui.visualize(self.state) # Always visualize at the end of the loop iteration
 
+        self.services.stop() # Cancel generations still in flight
+        self.mail_spool.stop() # Undelivered mail stays spooled for the next start
         self.task_manager.save_state(TASKS_FILE) # Save all task data before exiting
         pygame.quit()
 
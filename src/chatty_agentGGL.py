@@ -5,7 +5,9 @@ from datetime import datetime, timedelta
 import os
 import time
 import random
-from dateutil.parser import parse, ParserError # Import ParserError for better error handling
+from dateutil.parser import ParserError # Import ParserError for better error handling
+
+from time_phrases import TIME_PHRASES
 
 # --- Configuration Constants ---
 DATA_DIR = "agent_data"
@@ -140,10 +142,10 @@ class ChattyAgent:
                  return {"action": "unknown", "message": f"Please specify a time for the scheduled task (e.g., 'schedule task:{desc} at 1:15')!"}
 
             try:
-                # Use fuzzy=True for more lenient parsing (e.g., "1pm", "five past two")
-                parsed_time = parse(time_str, fuzzy=True)
-                # Format to HH:MM to store consistently
-                time_match = parsed_time.strftime("%H:%M")
+                # Regex fast path, then a cache of earlier fuzzy parses (e.g., "1pm", "five past two"), as HH:MM
+                time_match = TIME_PHRASES.resolve(time_str)
+                if time_match is None:
+                    raise ParserError(time_str)
                 recurring = "recurring" in command
                 return {"action": "schedule", "desc": desc, "time": time_match, "recurring": recurring}
             except ParserError:
@@ -1,6 +1,13 @@
 # --- Configuration Constants ---
 DATA_DIR = "agent_data"
 TASKS_FILE = f"{DATA_DIR}/tasks.json"
+TASKS_DB_FILE = f"{DATA_DIR}/tasks.db"
+TASK_STORE = "json" # "json": in memory, saved to TASKS_FILE + JOURNAL_FILE; "sqlite": TASKS_DB_FILE (imports TASKS_FILE once)
+ARCHIVE_DIR = f"{DATA_DIR}/archive" # Compressed monthly segments of old completed tasks (json store)
+ARCHIVE_AFTER_DAYS = 7 # Completed tasks older than this leave memory
+JOURNAL_FILE = f"{DATA_DIR}/tasks.journal" # Append-only change log replayed on top of TASKS_FILE
+JOURNAL_FSYNC_BATCH = 32 # Journal entries written between fsyncs
+JOURNAL_FSYNC_INTERVAL = 1.0 # Max seconds an entry stays unsynced
 ALERT_SOUND_FILE = "alert.wav"
 BEEP_SOUND_FILE = "beep.wav"
 SCREEN_WIDTH = 800
@@ -13,9 +20,32 @@ AGENT_COLOR_GREETING = (0, 255, 0)
 AGENT_COLOR_EXITING = (255, 0, 0)
 AGENT_COLOR_ALERT = (255, 165, 0)
 CHECK_INTERVAL = 5
+LIST_PAGE_SIZE = 10 # Tasks per page for 'list tasks page N' / 'review completed page N'
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_MODEL = "codellama:7b"
+OLLAMA_CONNECT_TIMEOUT = 3.05 # Seconds to establish the connection
+OLLAMA_READ_TIMEOUT = 30 # Seconds to wait for the response (for streams: between chunks)
+OLLAMA_RETRIES = 2 # Extra attempts after a connection error (or connect timeout) or a 5xx; read timeouts are not retried
+OLLAMA_RETRY_BACKOFF = 0.5 # Base seconds for jittered exponential backoff between attempts
+OLLAMA_KEEP_ALIVE = "30m" # How long Ollama keeps the model loaded after a request ("5m", "1h", seconds, -1 = forever; None: server default)
+OLLAMA_WARM_UP = True # Load the model when the agent starts, so the first generation does not pay for it
+OLLAMA_LOAD_ESTIMATE = 30 # Seconds a model load is assumed to take until one has been measured
+OLLAMA_LOAD_MARGIN = 1.5 # Keep-warm pings go out this many load estimates before the expected generation
+OLLAMA_MAX_CONCURRENT = 2 # Distinct generations a client runs at once (identical requests share one); more wait their turn
+RESPONSE_CACHE_ENABLED = False # Reuse the text generated for an identical (model, prompt, options); handy for repeat and test runs
+RESPONSE_CACHE_DIR = f"{DATA_DIR}/response_cache"
+RESPONSE_CACHE_TTL = 24 * 60 * 60 # Seconds a cached response stays usable
+RESPONSE_CACHE_MAX_BYTES = 5 * 1024 * 1024 # Least recently used responses are dropped beyond this
 EMAIL_SERVER = "localhost"
 EMAIL_PORT = 1025
 EMAIL_FROM = "agent@local.com"
 EMAIL_TO = ["user1@local.com", "user2@local.com"]  # Update with your test emails
-BLOG_INTERVAL = 15 * 60  # 15 minutes in seconds for testing
\ No newline at end of file
+EMAIL_TIMEOUT = 10 # Seconds to wait for each reply from the SMTP server
+EMAIL_IDLE_TIMEOUT = 60 # Seconds an open SMTP session may sit unused before EmailClient reconnects instead of reusing it
+EMAIL_MAX_CONCURRENT = 4 # SMTP sessions AsyncEmailClient keeps, and messages it sends at once
+MAIL_SPOOL_DIR = f"{DATA_DIR}/mail_spool" # Outbound mail waits here until delivered; failed-for-good mail goes to its dead/ folder
+MAIL_MAX_ATTEMPTS = 6 # Delivery attempts before a message is dead-lettered
+MAIL_RETRY_BACKOFF = 30 # Seconds before the first retry; doubles per attempt (capped at an hour)
+BLOG_INTERVAL = 15 * 60  # 15 minutes in seconds for testing
+BLOG_INITIAL_ESTIMATE = 60 # Seconds a generation is assumed to take until one has been timed
+BLOG_PREFETCH_MARGIN = 1.5 # Generation starts this many estimated generation times before a post is due
\ No newline at end of file
@@ -0,0 +1,57 @@
+# email_benchmark.py
+"""
+Sends the same messages through a new SMTP connection per message (the old EmailClient) and through
+EmailClient's reused session and batch API, and prints the timings.
+Needs a debugging SMTP server on EMAIL_SERVER:EMAIL_PORT, e.g. python -m aiosmtpd -n -l localhost:1025
+Run from src/: python email_benchmark.py [number of messages]
+"""
+import smtplib
+import sys
+import time
+
+from config import EMAIL_SERVER, EMAIL_PORT
+from external_services import EmailClient, build_email
+
+def connect_per_message(messages):
+    """The previous send_email: connect, handshake, send and quit for every message."""
+    for subject, body in messages:
+        with smtplib.SMTP(EMAIL_SERVER, EMAIL_PORT) as server:
+            server.send_message(build_email(subject, body))
+
+def main(count=200):
+    messages = [(f"Benchmark {i}", f"Message {i} of {count}.") for i in range(count)]
+    try:
+        start = time.perf_counter()
+        connect_per_message(messages)
+        old_time = time.perf_counter() - start
+    except OSError as e:
+        print(f"No SMTP server at {EMAIL_SERVER}:{EMAIL_PORT} ({e}); start one first.")
+        return 1
+
+    client = EmailClient()
+    start = time.perf_counter()
+    for subject, body in messages:
+        client.send_email(subject, body)
+    reused_time = time.perf_counter() - start
+    client.close()
+
+    client = EmailClient()
+    start = time.perf_counter()
+    sent = client.send_batch(messages)
+    batch_time = time.perf_counter() - start
+    client.close()
+
+    client = EmailClient()
+    recipients = [f"user{i}@local.com" for i in range(count)]
+    start = time.perf_counter()
+    personalized = client.send_personalized("Your digest", lambda recipient: f"Hi {recipient.split('@')[0]}, here is your digest.", recipients)
+    personalized_time = time.perf_counter() - start
+    client.close()
+
+    print(f"{count} messages: connection per message {old_time:.3f}s, reused session {reused_time:.3f}s ({old_time / reused_time:.1f}x), "
+          f"send_batch {batch_time:.3f}s ({old_time / batch_time:.1f}x, {sent} sent)")
+    print(f"send_personalized: {personalized} recipients in {personalized_time:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -1,32 +1,385 @@
+from collections import deque
+import json
+import random
+import statistics
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import smtplib
 from email.mime.text import MIMEText
-from config import OLLAMA_API_URL, EMAIL_SERVER, EMAIL_PORT, EMAIL_FROM, EMAIL_TO
+from config import OLLAMA_API_URL, OLLAMA_MODEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT, OLLAMA_RETRIES, OLLAMA_RETRY_BACKOFF, OLLAMA_MAX_CONCURRENT, \
+                   OLLAMA_KEEP_ALIVE, OLLAMA_LOAD_ESTIMATE, OLLAMA_LOAD_MARGIN, \
+                   EMAIL_SERVER, EMAIL_PORT, EMAIL_FROM, EMAIL_TO, EMAIL_TIMEOUT, EMAIL_IDLE_TIMEOUT
+
+DEFAULT_BLOG_PROMPT = "Write a 200-word blog post on a productivity topic."
+ERROR_PREFIX = "Error generating blog: "
+RETRY_STATUSES = {500, 502, 503, 504}
+
+def keep_alive_seconds(keep_alive):
+    """Ollama's keep_alive ("30m", "1h", "90s", 300, -1) in seconds; None (server default) is 5 minutes, negative is forever."""
+    if keep_alive is None:
+        return 300
+    if isinstance(keep_alive, (int, float)):
+        return float("inf") if keep_alive < 0 else float(keep_alive)
+    value = keep_alive.strip().lower()
+    if value.startswith("-"):
+        return float("inf")
+    units = {"h": 3600, "m": 60, "s": 1}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+class ModelWarmth:
+    """
+    Tracks whether the model is likely still loaded in Ollama: when it was last used, how long a load takes
+    (Ollama reports load_duration), and the latency of cold requests (that had to load the model) apart
+    from warm ones.
+    """
+    COLD_LOAD = 0.25 # Seconds of load_duration above which a request counts as cold (a loaded model reports a few ms)
+
+    def __init__(self, keep_alive=OLLAMA_KEEP_ALIVE, load_estimate=OLLAMA_LOAD_ESTIMATE, load_margin=OLLAMA_LOAD_MARGIN):
+        self.keep_alive = keep_alive_seconds(keep_alive)
+        self.load_estimate = load_estimate
+        self.load_margin = load_margin # Loads vary; warming up this many estimates early leaves room for a slow one
+        self.last_used = None # time.monotonic() of the last finished request
+        self.cold = deque(maxlen=50) # Latencies in seconds
+        self.warm = deque(maxlen=50)
+
+    def warm_up_lead(self):
+        """Seconds before an expected generation that a keep-warm ping goes out: load_margin load estimates."""
+        return self.load_estimate * self.load_margin
+
+    def record(self, latency, load_duration=None, generation=True):
+        """
+        Files one finished request; load_duration is Ollama's, in nanoseconds, if it sent one.
+        Warm-ups pass generation=False: they refresh the bookkeeping but are not counted as cold or warm generations.
+        """
+        now = time.monotonic()
+        if load_duration is not None:
+            cold = load_duration / 1e9 > self.COLD_LOAD
+            if cold:
+                self.load_estimate = load_duration / 1e9
+        else:
+            cold = self.last_used is None or now - latency - self.last_used > self.keep_alive
+        if generation:
+            (self.cold if cold else self.warm).append(latency)
+        self.last_used = now
+
+    def loaded_at(self, when):
+        """Whether the model should still be loaded at time.monotonic() value `when`."""
+        return self.last_used is not None and when - self.last_used < self.keep_alive
+
+    def stats(self):
+        result = {"keep_alive": self.keep_alive, "load_estimate": self.load_estimate}
+        for name, latencies in (("cold", self.cold), ("warm", self.warm)):
+            result[name] = {"count": len(latencies), "mean": statistics.fmean(latencies) if latencies else None}
+        return result
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    return {"count": len(ordered), "mean": statistics.fmean(ordered), "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], "max": ordered[-1]}
+
+def flight_key(model, prompt, options):
+    """What makes two generation requests interchangeable."""
+    return model, prompt, json.dumps(options, sort_keys=True)
+
+class _Flight:
+    """One in-flight generation and everyone waiting on it."""
+    def __init__(self, on_chunk=None):
+        self.parts = [] # Pieces streamed so far, replayed to callers that join late
+        self.listeners = [on_chunk] if on_chunk is not None else []
+        self.text = f"{ERROR_PREFIX}the generation was interrupted"
+        self.done = threading.Event()
 
 class OllamaClient:
+    """
+    Talks to Ollama over one pooled keep-alive session, so repeated generations reuse the connection.
+    Connection errors (including connect timeouts) and 5xx responses are retried with jittered exponential backoff,
+    and the latency of every request is kept (see latency_stats).
+    With a ResponseCache, a prompt already answered for the same model and options is not generated again.
+    Concurrent calls for the same model, prompt and options share one generation (singleflight), and at most
+    max_concurrent distinct generations run at once; further callers wait for a slot.
+    Every request asks Ollama to keep the model loaded for keep_alive; warm_up() loads it ahead of use and
+    keep_warm_at() schedules that for just before an expected generation (see ModelWarmth for the bookkeeping).
+    """
+    def __init__(self, api_url=OLLAMA_API_URL, model=OLLAMA_MODEL, connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout=OLLAMA_READ_TIMEOUT, retries=OLLAMA_RETRIES, retry_backoff=OLLAMA_RETRY_BACKOFF,
+                 options=None, cache=None, max_concurrent=OLLAMA_MAX_CONCURRENT, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.api_url = api_url # Point this at a stand-in server to test without Ollama
+        self.model = model
+        self.options = options # Ollama generation options (temperature, num_predict, ...), part of the cache key
+        self.cache = cache
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.latencies = deque(maxlen=200) # Seconds per request: until the full response, or until a stream ends
+        self.coalesced = 0 # Calls that joined a generation already in flight instead of starting their own
+        self.keep_alive = keep_alive
+        self.warmth = ModelWarmth(keep_alive)
+        self._keep_warm_timer = None
+        self._flights = {} # flight_key -> _Flight
+        self._flights_lock = threading.Lock()
+        self._generations = threading.BoundedSemaphore(max_concurrent)
+
+    def _payload(self, prompt, stream):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        if self.options:
+            payload["options"] = self.options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def warm_up(self):
+        """Loads the model without generating anything (Ollama does that for an empty prompt); returns True if it worked."""
+        try:
+            start = time.perf_counter()
+            response = self._post(self._payload("", False))
+            self.warmth.record(time.perf_counter() - start, response.json().get("load_duration"), generation=False)
+            return True
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not warm up {self.model}: {e}")
+            return False
+
+    def keep_warm_at(self, when):
+        """
+        Makes sure the model is loaded by time.monotonic() value `when` (the next expected generation):
+        if keep_alive would have unloaded it by then, a warm-up is scheduled warmth.warm_up_lead() seconds before it.
+        """
+        if self._keep_warm_timer is not None:
+            self._keep_warm_timer.cancel()
+            self._keep_warm_timer = None
+        if self.warmth.loaded_at(when):
+            return
+        delay = max(0.0, when - self.warmth.warm_up_lead() - time.monotonic())
+        self._keep_warm_timer = threading.Timer(delay, self.warm_up)
+        self._keep_warm_timer.daemon = True
+        self._keep_warm_timer.start()
+
+    def _post(self, payload, stream=False):
+        """
+        POSTs with retries; returns the response with a 2xx status or raises requests.RequestException.
+        A read timeout is not retried: on a slow host it means the generation is long, and retrying would start it over.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(self.api_url, json=payload, stream=stream, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                response.close()
+                print(f"Ollama answered {response.status_code}; retrying ({attempt + 1}/{self.retries}).")
+            except requests.ConnectionError as e: # Includes ConnectTimeout; ReadTimeout propagates
+                if attempt == self.retries:
+                    raise
+                print(f"Ollama request failed ({e}); retrying ({attempt + 1}/{self.retries}).")
+            time.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt)) # Full jitter
+
+    def latency_stats(self):
+        """Count, mean, median, 95th percentile and max of the recorded request latencies, in seconds."""
+        return latency_summary(self.latencies)
+
     # Made generate_blog accept a prompt for flexibility
-    def generate_blog(self, prompt="Write a 200-word blog post on a productivity topic."):
+    def generate_blog(self, prompt=DEFAULT_BLOG_PROMPT, on_chunk=None):
+        """
+        Returns the whole generated text. With on_chunk, the text is streamed and each piece is
+        passed to on_chunk as soon as Ollama sends it; the return value is still the full text.
+        A cached answer is returned at once (and passed to on_chunk in one piece).
+        A call made while the same generation is in flight waits for it instead of starting another; its
+        on_chunk first gets the pieces streamed so far, then the rest as they arrive (or the whole text at
+        the end, if the first caller did not stream).
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, self.options)
+            if cached is not None:
+                if on_chunk is not None:
+                    on_chunk(cached)
+                return cached
+        key = flight_key(self.model, prompt, self.options)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if not leader:
+                self.coalesced += 1
+                if on_chunk is not None:
+                    for piece in flight.parts:
+                        on_chunk(piece)
+                    flight.listeners.append(on_chunk)
+            else:
+                flight = self._flights[key] = _Flight(on_chunk)
+        if not leader:
+            flight.done.wait()
+            return flight.text
+        try:
+            with self._generations:
+                flight.text = self._generate(prompt, flight, stream=on_chunk is not None)
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.text
+
+    def _emit(self, flight, piece, record=True):
+        with self._flights_lock:
+            if record:
+                flight.parts.append(piece)
+            listeners = list(flight.listeners)
+        for listener in listeners:
+            listener(piece)
+
+    def _generate(self, prompt, flight, stream):
+        if stream:
+            for piece in self.stream_blog(prompt):
+                self._emit(flight, piece)
+            text = "".join(flight.parts)
+            failed = not flight.parts or flight.parts[-1].startswith(ERROR_PREFIX)
+        else:
+            try:
+                start = time.perf_counter()
+                response = self._post(self._payload(prompt, False))
+                body = response.json()
+                text = body.get("response")
+                self.latencies.append(time.perf_counter() - start)
+                self.warmth.record(self.latencies[-1], body.get("load_duration"))
+                failed = not text
+                text = text or "Failed to generate blog."
+            except (requests.RequestException, ValueError) as e:
+                text, failed = f"{ERROR_PREFIX}{e}", True
+            self._emit(flight, text, record=False) # Callers that joined with on_chunk get the text in one piece
+        if self.cache is not None and not failed: # Errors are never cached
+            self.cache.put(self.model, prompt, text, self.options)
+        return text
+
+    def stream_blog(self, prompt=DEFAULT_BLOG_PROMPT):
+        """
+        Yields the text as Ollama generates it, one newline-delimited JSON chunk at a time, until the
+        chunk marked "done". The read timeout applies to each wait between chunks, not the whole generation;
+        only the request itself is retried, never a stream that has started.
+        Errors are yielded as an error message, as generate_blog returns them. The cache is not consulted here.
+        """
         try:
-            payload = {
-                "model": "codellama:7b",
-                "prompt": prompt,
-                "stream": False
-            }
-            response = requests.post(OLLAMA_API_URL, json=payload, timeout=30)
-            response.raise_for_status()
-            return response.json().get("response", "Failed to generate blog.")
-        except requests.RequestException as e:
-            return f"Error generating blog: {e}"
+            start = time.perf_counter()
+            with self._post(self._payload(prompt, True), stream=True) as response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        yield f"{ERROR_PREFIX}{chunk['error']}"
+                        return
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        self.latencies.append(time.perf_counter() - start)
+                        self.warmth.record(self.latencies[-1], chunk.get("load_duration"))
+                        return
+        except (requests.RequestException, ValueError) as e: # ValueError: a malformed chunk
+            yield f"{ERROR_PREFIX}{e}"
+
+def build_email(subject, body, recipients=EMAIL_TO):
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = EMAIL_FROM
+    msg["To"] = ", ".join(recipients)
+    return msg
 
 class EmailClient:
-    def send_email(self, subject, body):
+    """
+    Keeps one SMTP session open between messages instead of connecting and handshaking for each.
+    A session idle for longer than idle_timeout is closed before reuse (relays drop idle clients anyway),
+    and a message that finds the session dropped is retried once on a fresh one.
+    send_batch and send_personalized deliver many messages over the same session.
+    """
+    def __init__(self, server=EMAIL_SERVER, port=EMAIL_PORT, idle_timeout=EMAIL_IDLE_TIMEOUT, timeout=EMAIL_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connections = 0 # Sessions opened so far
+        self.last_error = None # Text of the most recent failure, for callers that retry later
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._close()
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            self.connections += 1
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _deliver(self, msg):
+        """Sends over the open session, reconnecting once if the server has dropped it. Call with the lock held."""
         try:
-            msg = MIMEText(body)
-            msg["Subject"] = subject
-            msg["From"] = EMAIL_FROM
-            msg["To"] = ", ".join(EMAIL_TO)
-            with smtplib.SMTP(EMAIL_SERVER, EMAIL_PORT) as server:
-                server.send_message(msg)
-            print(f"Email sent to {', '.join(EMAIL_TO)} with subject: {subject}")
-        except smtplib.SMTPException as e:
-            print(f"Failed to send email: {e}")
\ No newline at end of file
+            self._session().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._close()
+            self._session().send_message(msg)
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code != 421: # 421: the server is closing the session
+                raise
+            self._close()
+            self._session().send_message(msg)
+        self._last_used = time.monotonic()
+
+    def send_email(self, subject, body, recipients=EMAIL_TO):
+        """Returns True if the message was accepted."""
+        return self.send_batch([(subject, body, recipients)]) == 1
+
+    def send_batch(self, messages):
+        """
+        Sends (subject, body) or (subject, body, recipients) tuples over one session; returns how many were accepted.
+        A message the server rejects is reported and skipped; losing the connection for good stops the batch.
+        """
+        sent = 0
+        with self._lock:
+            for message in messages:
+                subject, body = message[0], message[1]
+                recipients = message[2] if len(message) > 2 else EMAIL_TO
+                try:
+                    self._deliver(build_email(subject, body, recipients))
+                    sent += 1
+                    print(f"Email sent to {', '.join(recipients)} with subject: {subject}")
+                except (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected) as e:
+                    self._failed(e)
+                    self._close()
+                    break
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e: # smtplib has already reset the session
+                    self._failed(e)
+                except (smtplib.SMTPException, OSError) as e:
+                    self._failed(e)
+                    self._close()
+                    break
+        return sent
+
+    def _failed(self, error):
+        self.last_error = str(error) or type(error).__name__
+        print(f"Failed to send email: {self.last_error}")
+
+    def send_personalized(self, subject, body_for, recipients=EMAIL_TO):
+        """Sends each recipient their own message, with body_for(recipient) as the body, over one session."""
+        return self.send_batch((subject, body_for(recipient), [recipient]) for recipient in recipients)
+
+    def close(self):
+        with self._lock:
+            self._close()
\ No newline at end of file
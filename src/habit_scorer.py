@@ -0,0 +1,96 @@
+# habit_scorer.py
+import heapq
+import time
+
+class HabitScorer:
+    """
+    Time-decayed habit scores with an incrementally maintained best candidate.
+    Every add/complete of a task adds 1 to its score and scores halve every half-life.
+    Scores are stored relative to a fixed reference time, so decay never changes their order:
+    an event only touches the task it concerns, and the best suggestion is read off a lazy max-heap.
+    The suggestion score keeps the old rule, decayed frequency * (1 + feedback), and only positive scores count.
+    """
+    MAX_EXPONENT = 512 # Rebase before 2 ** exponent gets anywhere near float overflow
+
+    def __init__(self, half_life_days=14):
+        self.half_life = half_life_days * 24 * 3600
+        self.reference_time = None # Set by the first recorded event, so replaying the same events gives the same scores
+        self._scores = {} # Task desc -> decayed event count, scaled to reference_time
+        self._feedback = {} # Task desc -> accumulated feedback
+        self._heap = [] # (-adjusted score, desc); entries whose score has since changed are skipped
+
+    def _adjusted(self, desc):
+        return self._scores[desc] * (1 + self._feedback.get(desc, 0))
+
+    def _push(self, desc):
+        adjusted = self._adjusted(desc)
+        if adjusted > 0:
+            heapq.heappush(self._heap, (-adjusted, desc))
+        if len(self._heap) > 2 * len(self._scores) + 64:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(-self._adjusted(d), d) for d in self._scores if self._adjusted(d) > 0]
+        heapq.heapify(self._heap)
+
+    def _rebase(self, at):
+        shift = (at - self.reference_time) / self.half_life
+        factor = 2.0 ** -shift
+        for desc in self._scores:
+            self._scores[desc] *= factor
+        self.reference_time = at
+        self._rebuild_heap()
+
+    def record(self, desc, at=None):
+        """Counts one add/complete of desc (lowercase) at epoch time at (default now)."""
+        at = time.time() if at is None else at
+        if self.reference_time is None:
+            self.reference_time = at
+        exponent = (at - self.reference_time) / self.half_life
+        if exponent > self.MAX_EXPONENT:
+            self._rebase(at)
+            exponent = 0
+        self._scores[desc] = self._scores.get(desc, 0.0) + 2.0 ** exponent
+        self._push(desc)
+
+    def set_feedback(self, desc, feedback):
+        self._feedback[desc] = feedback
+        if desc in self._scores:
+            self._push(desc)
+
+    def best(self):
+        """The task with the highest positive adjusted score, or None. Amortized O(log n)."""
+        while self._heap:
+            negative_score, desc = self._heap[0]
+            if desc in self._scores and -negative_score == self._adjusted(desc):
+                return desc
+            heapq.heappop(self._heap) # Stale: the score changed after this entry was pushed
+        return None
+
+    def score(self, desc, now=None):
+        """Current decayed frequency of desc."""
+        now = time.time() if now is None else now
+        if desc not in self._scores:
+            return 0.0
+        return self._scores.get(desc, 0.0) * 2.0 ** ((self.reference_time - now) / self.half_life)
+
+    def clear(self):
+        self.reference_time = None
+        self._scores.clear()
+        self._feedback.clear()
+        self._heap.clear()
+
+    def to_dict(self):
+        return {"reference_time": self.reference_time, "scores": dict(self._scores)}
+
+    def load(self, task_history, feedback_history, saved=None):
+        """Restores saved scores; state files without them start from the raw history counts."""
+        self.clear()
+        if saved:
+            self.reference_time = saved["reference_time"]
+            self._scores = dict(saved["scores"])
+        elif task_history:
+            self.reference_time = time.time()
+            self._scores = {desc: float(count) for desc, count in task_history.items()}
+        self._feedback = dict(feedback_history)
+        self._rebuild_heap()
@@ -0,0 +1,89 @@
+# intent_fallback.py
+from collections import Counter
+import threading
+
+import numpy as np
+
+# Canonical command heads; a mistyped head is matched against these
+INTENT_PHRASINGS = ( # "hello" is left out: it has never been an intent parse() returns
+    ("add_task", "add task:"),
+    ("schedule_task", "schedule task:"),
+    ("schedule_task", "schedule recurring:"),
+    ("schedule_task", "schedule daily:"),
+    ("schedule_task", "schedule weekly:"),
+    ("schedule_task", "schedule weekdays:"),
+    ("set_priority", "set priority:"),
+    ("feedback", "feedback:"),
+    ("generate_blog", "generate blog"),
+    ("complete_task", "complete task:"),
+    ("review_completed", "review completed"),
+    ("list_tasks", "list tasks"),
+    ("mail_status", "mail status"),
+    ("clear_tasks", "clear tasks"),
+    ("exit", "exit"),
+)
+AUTO_ROUTE_INTENTS = {"list_tasks", "review_completed", "mail_status"} # Read-only: safe to run on a guess. Anything that changes data is only suggested
+AUTO_ROUTE_THRESHOLD = 0.65 # Cosine similarity at which a read-only command's head is rewritten and the command re-parsed
+SUGGEST_THRESHOLD = 0.5 # Below this the command stays plain unknown
+
+def _grams(text):
+    padded = f" {text} "
+    return [padded[i:i + n] for n in (2, 3) for i in range(len(padded) - n + 1)]
+
+class NearestIntent:
+    """
+    Finds the known command head closest to a mistyped one ("lsit tasks", "shedule task:").
+    Heads are compared as character 2/3-gram count vectors; the table of canonical heads is a
+    small row-normalized matrix built on first use, so a query is one matrix product plus the
+    n-gram extraction, a few microseconds. Nothing is built or loaded until a command fails to parse.
+    """
+    def __init__(self, phrasings=INTENT_PHRASINGS):
+        self.phrasings = phrasings
+        self._vocabulary = None # n-gram -> column
+        self._matrix = None # One unit-length row per phrasing
+        self._lock = threading.Lock()
+
+    def _build(self):
+        vocabulary = {}
+        for _, phrase in self.phrasings:
+            for gram in _grams(phrase):
+                vocabulary.setdefault(gram, len(vocabulary))
+        matrix = np.zeros((len(self.phrasings), len(vocabulary)))
+        for row, (_, phrase) in enumerate(self.phrasings):
+            for gram in _grams(phrase):
+                matrix[row, vocabulary[gram]] += 1
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._matrix = matrix
+        self._vocabulary = vocabulary
+
+    @staticmethod
+    def _heads(command):
+        """Candidate (head, rest) splits: up to the first ':' if there is one, else the first one or two words."""
+        colon = command.find(":")
+        if colon >= 0:
+            return [(command[:colon + 1], command[colon + 1:])]
+        words = command.split(" ", 2)
+        return [(" ".join(words[:n]), command[len(" ".join(words[:n])):]) for n in (1, 2) if n <= len(words)]
+
+    def nearest(self, command):
+        """Returns (intent, phrasing, rest of the command, similarity) for the best match; callers check the similarity."""
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._build()
+        heads = self._heads(command)
+        queries = np.zeros((len(self._vocabulary), len(heads)))
+        norms = np.empty(len(heads))
+        for column, (head, _) in enumerate(heads):
+            grams = _grams(head)
+            for gram in grams:
+                index = self._vocabulary.get(gram)
+                if index is not None:
+                    queries[index, column] += 1
+            norms[column] = np.sqrt(sum(c * c for c in Counter(grams).values())) # Unknown n-grams still count against the match
+        scores = (self._matrix @ queries) / norms
+        row, column = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        intent, phrase = self.phrasings[row]
+        return intent, phrase, heads[column][1], float(scores[row, column])
+
+NEAREST_INTENT = NearestIntent()
@@ -0,0 +1,208 @@
+# mail_spool.py
+import asyncio
+from collections import deque
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from config import EMAIL_TO
+
+class MailSpool:
+    """
+    Outbound mail written to disk before anything talks to SMTP: enqueue() stores the message as one JSON
+    file in `directory` (fsync'd, atomically renamed) and returns at once. A background thread delivers
+    due messages through an EmailClient one at a time, or through an AsyncEmailClient all at once (up to its
+    concurrency limit, on an event loop the thread keeps), retrying failures with jittered exponential backoff; a message that
+    fails max_attempts times moves to `directory`/dead. Messages still spooled at exit are picked up
+    again on the next start, so nothing enqueued is lost.
+    """
+    def __init__(self, directory, client, max_attempts=6, backoff=30, max_backoff=3600, on_event=None):
+        self.directory = directory
+        self.dead_directory = os.path.join(directory, "dead")
+        self.client = client
+        self._async = inspect.iscoroutinefunction(getattr(client, "deliver", None)) # An AsyncEmailClient
+        self.max_attempts = max_attempts
+        self.backoff = backoff # Seconds before the first retry; doubles with every further attempt
+        self.max_backoff = max_backoff
+        self.on_event = on_event # Called as on_event(kind, message) with kind "sent" or "dead", from the worker thread
+        self.sent = 0
+        self.recent = deque(maxlen=20) # (id, outcome, subject) of the latest deliveries and dead letters
+        self._queue = {} # Message id -> message dict, as on disk
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        os.makedirs(self.dead_directory, exist_ok=True)
+        self._load()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _path(self, message_id, dead=False):
+        return os.path.join(self.dead_directory if dead else self.directory, message_id + ".json")
+
+    def _load(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    message = json.load(f)
+                self._queue[message["id"]] = message
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Could not read spooled mail {path}: {e}. Leaving it in place.")
+        if self._queue:
+            print(f"Mail spool: {len(self._queue)} message(s) left from the last run will be delivered.")
+
+    def _write(self, message, dead=False):
+        path = self._path(message["id"], dead)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(message, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def enqueue(self, subject, body, recipients=EMAIL_TO):
+        """Spools a message for delivery and returns its id; never waits on SMTP."""
+        now = time.time()
+        message = {"id": f"{int(now * 1000):013d}-{uuid.uuid4().hex[:8]}", "subject": subject, "body": body,
+                   "recipients": list(recipients), "created": now, "attempts": 0, "next_attempt": now, "last_error": None}
+        self._write(message)
+        with self._lock:
+            self._queue[message["id"]] = message
+        self._wake.set()
+        return message["id"]
+
+    def _due(self):
+        now = time.time()
+        with self._lock:
+            due = sorted((m for m in self._queue.values() if m["next_attempt"] <= now), key=lambda m: m["id"]) # Ids sort by enqueue time
+            next_attempt = min((m["next_attempt"] for m in self._queue.values() if m["next_attempt"] > now), default=None)
+        return due, next_attempt
+
+    def _run(self):
+        loop = asyncio.new_event_loop() if self._async else None
+        try:
+            while not self._stopping:
+                due, next_attempt = self._due()
+                if due and loop is not None:
+                    loop.run_until_complete(self._attempt_all(due))
+                elif due:
+                    for message in due:
+                        if self._stopping:
+                            return
+                        self._attempt(message)
+                if due:
+                    continue # Look again: retries may already be due and new mail may have arrived
+                timeout = None if next_attempt is None else max(0.0, next_attempt - time.time())
+                self._wake.wait(timeout)
+                self._wake.clear()
+        finally:
+            if loop is not None:
+                loop.close()
+
+    def _attempt(self, message):
+        try:
+            delivered = self.client.send_email(message["subject"], message["body"], message["recipients"])
+            error = self.client.last_error
+        except Exception as e: # Anything the client did not handle counts as a failed attempt, not the end of the worker
+            print(f"Mail spool: unexpected error sending {message['id']}: {e!r}")
+            delivered, error = False, repr(e)
+        self._settle(message, delivered, error)
+
+    async def _attempt_all(self, messages):
+        await asyncio.gather(*(self._attempt_async(message) for message in messages))
+
+    async def _attempt_async(self, message):
+        if self._stopping:
+            return # Not started yet; stays spooled for next time
+        try:
+            error = await self.client.deliver(message["subject"], message["body"], message["recipients"])
+        except Exception as e:
+            print(f"Mail spool: unexpected error sending {message['id']}: {e!r}")
+            error = repr(e)
+        self._settle(message, error is None, error) # On the worker's own loop, so blocking file I/O here is fine
+
+    def _settle(self, message, delivered, error):
+        try:
+            self._record(message, delivered, error)
+        except Exception as e: # E.g. the disk is full; keep the message queued and retry it later
+            print(f"Mail spool: could not process {message['id']}: {e!r}")
+            with self._lock:
+                message["next_attempt"] = time.time() + min(self.max_backoff, self.backoff * 2 ** max(0, message["attempts"] - 1))
+
+    def _record(self, message, delivered, error):
+        if delivered:
+            try:
+                os.remove(self._path(message["id"]))
+            except OSError as e:
+                print(f"Warning: Could not remove delivered mail {self._path(message['id'])}: {e}")
+            with self._lock:
+                self._queue.pop(message["id"], None)
+                self.sent += 1
+                self.recent.append((message["id"], "sent", message["subject"]))
+            self._notify("sent", message)
+            return
+        message["attempts"] += 1
+        message["last_error"] = error
+        if message["attempts"] >= self.max_attempts:
+            self._write(message, dead=True)
+            os.remove(self._path(message["id"]))
+            with self._lock:
+                self._queue.pop(message["id"], None)
+                self.recent.append((message["id"], "dead", message["subject"]))
+            self._notify("dead", message)
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (message["attempts"] - 1))
+        message["next_attempt"] = time.time() + random.uniform(delay / 2, delay) # Jitter so a relay outage does not end in a burst
+        self._write(message)
+
+    def _notify(self, kind, message):
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, message)
+            except Exception as e:
+                print(f"Mail spool: on_event failed for {message['id']}: {e!r}")
+
+    def status(self, message_id=None):
+        """
+        With an id: "queued", "sent", "dead" or "unknown" (sent and dead are remembered for recent messages;
+        dead letters also by their file). Without: counts, the next retry and the last error.
+        """
+        with self._lock:
+            if message_id is not None:
+                if message_id in self._queue:
+                    return "queued"
+                for recent_id, outcome, _ in self.recent:
+                    if recent_id == message_id:
+                        return outcome
+                return "dead" if os.path.exists(self._path(message_id, dead=True)) else "unknown"
+            retrying = [m for m in self._queue.values() if m["attempts"]]
+            return {"queued": len(self._queue), "retrying": len(retrying), "sent": self.sent,
+                    "dead": sum(1 for name in os.listdir(self.dead_directory) if name.endswith(".json")),
+                    "next_retry": min((m["next_attempt"] for m in retrying), default=None),
+                    "last_error": max(retrying, key=lambda m: m["next_attempt"])["last_error"] if retrying else None}
+
+    def retry_dead(self):
+        """Moves every dead letter back into the queue with a fresh attempt count; returns how many."""
+        names = [name for name in os.listdir(self.dead_directory) if name.endswith(".json")]
+        for name in names:
+            with open(os.path.join(self.dead_directory, name), "r", encoding="utf-8") as f:
+                message = json.load(f)
+            message.update(attempts=0, next_attempt=time.time())
+            self._write(message)
+            os.remove(os.path.join(self.dead_directory, name))
+            with self._lock:
+                self._queue[message["id"]] = message
+        self._wake.set()
+        return len(names)
+
+    def stop(self, timeout=5):
+        """Stops the worker after the message (or, with an AsyncEmailClient, the messages) it is sending; anything still queued stays on disk for next time."""
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
@@ -0,0 +1,158 @@
+# nlu_benchmark.py
+"""
+Micro-benchmark for NLUParser: replays a synthetic command log through the precompiled dispatcher and
+through the baseline parser (copied verbatim below), checks that every command the baseline accepts still
+means the same, and prints the timings;
+then times resolving repeated time phrases through the cache against calling dateutil every time,
+and NLUParser.parse_many against calling parse once per command.
+Run from src/: python nlu_benchmark.py [number of commands]
+"""
+import re
+import sys
+import time
+import tracemalloc
+
+from dateutil.parser import parse, ParserError
+
+from nlu_parser import NLUParser
+from time_phrases import TIME_PHRASES
+
+SAMPLE_TIMES = ["9am", "noon", "14:30", "2:30 PM", "9.30", "five past two", "tomorrow at 9", "7 pm"]
+SAMPLE_COMMANDS = [
+    "list tasks", "List Tasks page 2", "list tasks due today", "review completed", "review completed page 3",
+    "add task:buy milk", "add task:Call the plumber", "complete task:milk", "complete task:2025-01-01 09:00",
+    "set priority:standup to 3", "feedback:read a book on like", "feedback:go for a run on bad",
+    "generate blog", "mail status", "clear tasks", "hello", "exit", "what can you do?", "add task", "schedule task:nothing",
+    "schedule task:buy milk at 5pm", "schedule recurring:standup (priority:3) at 9:30", "schedule weekly:review at 10:00",
+    "schedule every 15 minutes:stretch",
+]
+
+def baseline_parse(command):
+    """NLUParser.parse as it was before the precompiled dispatcher, copied verbatim as the reference."""
+    command = command.lower().strip()
+    intent_patterns = {
+        "greet": r"hello",
+        "add_task": r"add task:(.+)",
+        "schedule_task": r"(schedule task|schedule recurring):(.+?)( at | for | in )(.+)",
+        "set_priority": r"set priority:(.+?)( to )(\d+)",
+        "feedback": r"feedback:(.+?)( on )(like|good|dislike|bad)", # Feedback intent matches this structure
+        "generate_blog": r"generate blog",
+        "complete_task": r"complete task:(.+)",
+        "review_completed": r"review completed",
+        "list_tasks": r"list tasks",
+        "clear_tasks": r"clear tasks",
+        "exit": r"exit"
+    }
+
+    for intent, pattern in intent_patterns.items():
+        match = re.match(pattern, command)
+        if match:
+            if intent == "add_task":
+                return {"action": "add", "desc": match.group(1).strip()}
+            elif intent == "schedule_task":
+                desc = match.group(2).strip()
+                time_str = match.group(4).strip()
+                priority_match = re.search(r"\(priority:(\d+)\)", desc)
+                priority = 1
+                if priority_match:
+                    try:
+                        priority = max(1, min(5, int(priority_match.group(1))))
+                        # Remove priority string from description only if it was successfully parsed
+                        desc = desc.replace(priority_match.group(0), "").strip()
+                    except ValueError:
+                        priority = 1 # Fallback if parsing fails
+
+                # Remove extra 'recurring' word from description if present
+                if "recurring" in match.group(1):
+                    desc = desc.replace("recurring", "").strip()
+
+                try:
+                    parsed_time = parse(time_str, fuzzy=True)
+                    time_match = parsed_time.strftime("%H:%M") # Just the time string
+                    return {"action": "schedule", "desc": desc, "time": time_match, "recurring": "recurring" in command, "priority": priority}
+                except ParserError:
+                    return {"action": "unknown", "message": f"Couldn’t parse time '{time_str}'."}
+            elif intent == "set_priority":
+                return {"action": "set_priority", "task_time": match.group(1).strip(), "priority": int(match.group(3))}
+            elif intent == "feedback":
+                suggestion = match.group(1).strip()
+                feedback_value_str = match.group(3)
+                feedback = 1 if "like" in feedback_value_str or "good" in feedback_value_str else -1 if "dislike" in feedback_value_str or "bad" in feedback_value_str else 0
+                # Remove 'response_text' from NLU result; ChattyAgent will craft it
+                return {"action": "feedback", "suggestion": suggestion, "feedback": feedback}
+            elif intent == "generate_blog":
+                return {"action": "generate_blog"}
+            elif intent == "complete_task":
+                return {"action": "complete", "identifier": match.group(1).strip()}
+            elif intent == "review_completed":
+                return {"action": "review"}
+            elif intent == "list_tasks":
+                return {"action": "list"}
+            elif intent == "clear_tasks":
+                return {"action": "clear"}
+            elif intent == "exit":
+                return {"action": "exit"}
+    return {"action": "unknown"}
+
+def same_meaning(old, new):
+    """
+    Whether the new parser keeps everything the baseline returned. Later requests only add to that:
+    'page' and 'due' on listings, and a recurrence rule where the baseline said recurring=True (a daily repeat).
+    """
+    return all(new.get(key) == ("daily" if key == "recurring" and value is True else value) for key, value in old.items())
+
+def run(parse, commands):
+    start = time.perf_counter()
+    results = [parse(command) for command in commands]
+    return time.perf_counter() - start, results
+
+def main(count=200000):
+    commands = [SAMPLE_COMMANDS[i % len(SAMPLE_COMMANDS)] for i in range(count)]
+    accepted = [c for c in SAMPLE_COMMANDS if baseline_parse(c)["action"] != "unknown"] # Commands the old grammar knows
+    changed = [c for c in accepted if not same_meaning(baseline_parse(c), NLUParser.parse(c))]
+    if changed:
+        print(f"results differ from the baseline parser for: {changed}")
+        return 1
+    identical = sum(baseline_parse(c) == NLUParser.parse(c) for c in accepted)
+    print(f"{len(accepted)} commands the baseline accepts: {identical} parse identically, {len(accepted) - identical} only gain later fields")
+    accepted_log = [accepted[i % len(accepted)] for i in range(count)]
+    without_times = [c for c in accepted_log if not c.startswith("schedule")] # Time phrases cost dateutil in the baseline
+    for label, log in (("baseline commands", accepted_log), ("baseline, no schedule commands", without_times),
+                       ("all commands, unknown ones through the nearest-intent fallback", commands)):
+        old_time, _ = run(baseline_parse, log)
+        new_time, _ = run(NLUParser.parse, log)
+        print(f"{label}: {len(log)} commands, baseline {old_time:.3f}s, precompiled {new_time:.3f}s ({old_time / new_time:.1f}x)")
+
+    phrases = [SAMPLE_TIMES[i % len(SAMPLE_TIMES)] for i in range(count // 10)]
+    start = time.perf_counter()
+    for phrase in phrases:
+        try:
+            parse(phrase, fuzzy=True)
+        except ParserError:
+            pass
+    dateutil_time = time.perf_counter() - start
+    TIME_PHRASES.clear()
+    cached_time, _ = run(TIME_PHRASES.resolve, phrases)
+    print(f"time phrases: {len(phrases)} phrases, dateutil {dateutil_time:.3f}s, cached {cached_time:.3f}s "
+          f"({dateutil_time / cached_time:.1f}x), {NLUParser.time_cache_stats()}")
+
+    loop_time, loop_results = run(NLUParser.parse, commands)
+    start = time.perf_counter()
+    batch_results = list(NLUParser.parse_many(commands))
+    batch_time = time.perf_counter() - start
+    if batch_results != loop_results:
+        print("parse_many: results differ!")
+        return 1
+    print(f"parse_many: {len(commands)} commands, per-command loop {loop_time:.3f}s, parse_many {batch_time:.3f}s ({loop_time / batch_time:.1f}x)")
+
+    # Streaming: a generator in, results consumed one by one, so peak memory does not grow with the input
+    tracemalloc.start()
+    for _ in NLUParser.parse_many(SAMPLE_COMMANDS[i % len(SAMPLE_COMMANDS)] for i in range(count * 5)):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"parse_many streaming: {count * 5} commands, peak traced memory {peak / 1024:.0f} KiB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
@@ -1,70 +1,176 @@
+from itertools import islice
 import re
-from dateutil.parser import parse, ParserError
+
+from intent_fallback import AUTO_ROUTE_INTENTS, AUTO_ROUTE_THRESHOLD, NEAREST_INTENT, SUGGEST_THRESHOLD
+from recurrence import normalize_rule
+from time_phrases import TIME_PHRASES
+
+# Intents in priority order. As with trying each pattern in turn with re.match, the first intent whose
+# pattern matches at the start of the command wins; the alternation below keeps that order.
+INTENT_PATTERNS = (
+    ("greet", r"hello"),
+    ("add_task", r"add task:(?P<add_desc>.+)"),
+    ("schedule_task", r"schedule (?P<schedule_kind>task|recurring|daily|weekly|weekdays|every weekday|every (?P<schedule_every>\d+) (?P<schedule_unit>minutes?|mins?|hours?))"
+                      r":(?P<schedule_desc>.+?)(?:(?: at | for | in )(?P<schedule_time>.+))?$"),
+    ("set_priority", r"set priority:(?P<priority_task>.+?) to (?P<priority_value>\d+)"),
+    ("feedback", r"feedback:(?P<feedback_suggestion>.+?) on (?P<feedback_value>like|good|dislike|bad)"), # Feedback intent matches this structure
+    ("generate_blog", r"generate blog"),
+    ("complete_task", r"complete task:(?P<complete_identifier>.+)"),
+    ("review_completed", r"review completed(?: page (?P<review_page>\d+))?"),
+    ("list_tasks", r"list tasks(?: due (?P<list_due>today))?(?: page (?P<list_page>\d+))?"),
+    ("mail_status", r"mail status"),
+    ("clear_tasks", r"clear tasks"),
+    ("exit", r"exit")
+)
+# One compiled regex for every intent, built at import; the outermost named group that matched is the intent
+INTENT_REGEX = re.compile("|".join(f"(?P<{intent}>{pattern})" for intent, pattern in INTENT_PATTERNS))
+PRIORITY_REGEX = re.compile(r"\(priority:(\d+)\)")
 
 class NLUParser:
     @staticmethod
     def parse(command):
         command = command.lower().strip()
-        intent_patterns = {
-            "greet": r"hello",
-            "add_task": r"add task:(.+)",
-            "schedule_task": r"(schedule task|schedule recurring):(.+?)( at | for | in )(.+)",
-            "set_priority": r"set priority:(.+?)( to )(\d+)",
-            "feedback": r"feedback:(.+?)( on )(like|good|dislike|bad)", # Feedback intent matches this structure
-            "generate_blog": r"generate blog",
-            "complete_task": r"complete task:(.+)",
-            "review_completed": r"review completed",
-            "list_tasks": r"list tasks",
-            "clear_tasks": r"clear tasks",
-            "exit": r"exit"
-        }
+        match = INTENT_REGEX.match(command)
+        if match is None:
+            return NLUParser._fallback(command)
+        return INTENT_HANDLERS[match.lastgroup](match)
+
+    @staticmethod
+    def _fallback(command):
+        """
+        For a command no pattern matched: if its head is a near miss of a known one ("lsit tasks"),
+        re-parse it with the corrected head (adding "corrected") if the intent only reads data; for intents that
+        change something, and for weaker matches, answer with a "Did you mean" message instead of the generic help.
+        """
+        if not command:
+            return {"action": "unknown"}
+        intent, phrase, rest, score = NEAREST_INTENT.nearest(command)
+        if score < SUGGEST_THRESHOLD:
+            return {"action": "unknown"}
+        corrected = phrase + rest
+        if score >= AUTO_ROUTE_THRESHOLD and intent in AUTO_ROUTE_INTENTS:
+            match = INTENT_REGEX.match(corrected)
+            if match is not None and match.lastgroup == intent:
+                result = INTENT_HANDLERS[intent](match)
+                if result["action"] != "unknown":
+                    result["corrected"] = corrected
+                    return result
+        return {"action": "unknown", "message": f"Did you mean ‘{corrected}’?"}
+
+    @staticmethod
+    def parse_many(commands, chunk_size=1024):
+        """
+        Parses an iterable of commands, yielding the same dicts as parse() in the same order.
+        Works through the input chunk_size commands at a time, so memory stays flat however long it is.
+        Each chunk is normalized once and every distinct command in it is parsed once (repeats get a copy);
+        schedule commands are set aside until the chunk's distinct time phrases are resolved in one pass.
+        """
+        commands = iter(commands)
+        while True:
+            chunk = [command.lower().strip() for command in islice(commands, chunk_size)]
+            if not chunk:
+                return
+            parsed = {}
+            schedules = [] # (command, match) for the schedule commands of this chunk
+            for command in dict.fromkeys(chunk):
+                match = INTENT_REGEX.match(command)
+                if match is None:
+                    parsed[command] = NLUParser._fallback(command)
+                elif match.lastgroup == "schedule_task":
+                    schedules.append((command, match))
+                else:
+                    parsed[command] = INTENT_HANDLERS[match.lastgroup](match)
+            if schedules:
+                phrases = {(match.group("schedule_time") or "").strip() for _, match in schedules}
+                times = {phrase: TIME_PHRASES.resolve(phrase) for phrase in phrases if phrase}
+                for command, match in schedules:
+                    parsed[command] = NLUParser._schedule(match, times.__getitem__)
+            for command in chunk:
+                yield dict(parsed[command]) # A fresh dict each time, as parse() would return
+
+    @staticmethod
+    def time_cache_stats():
+        """Counters of the shared time-phrase cache: fast-path answers, cache hits and misses, size."""
+        return TIME_PHRASES.stats()
 
-        for intent, pattern in intent_patterns.items():
-            match = re.match(pattern, command)
-            if match:
-                if intent == "add_task":
-                    return {"action": "add", "desc": match.group(1).strip()}
-                elif intent == "schedule_task":
-                    desc = match.group(2).strip()
-                    time_str = match.group(4).strip()
-                    priority_match = re.search(r"\(priority:(\d+)\)", desc)
-                    priority = 1
-                    if priority_match:
-                        try:
-                            priority = max(1, min(5, int(priority_match.group(1))))
-                            # Remove priority string from description only if it was successfully parsed
-                            desc = desc.replace(priority_match.group(0), "").strip()
-                        except ValueError:
-                            priority = 1 # Fallback if parsing fails
+    @staticmethod
+    def _schedule(match, resolve_time=TIME_PHRASES.resolve):
+        kind = match.group("schedule_kind")
+        desc = match.group("schedule_desc").strip()
+        time_str = (match.group("schedule_time") or "").strip()
+        every = match.group("schedule_every")
+        if kind == "task":
+            recurring = False
+        elif kind == "recurring":
+            recurring = "daily"
+        elif kind == "every weekday":
+            recurring = "weekdays"
+        elif every:
+            try:
+                recurring = normalize_rule(f"every {every} {match.group('schedule_unit')}")
+            except ValueError as e:
+                return {"action": "unknown", "message": f"Couldn’t use that schedule: {e}."}
+        else:
+            recurring = kind
+        if not time_str and not every:
+            return {"action": "unknown", "message": f"When should I schedule '{desc}'? Add 'at HH:MM'."}
+        priority_match = PRIORITY_REGEX.search(desc)
+        priority = 1
+        if priority_match:
+            try:
+                priority = max(1, min(5, int(priority_match.group(1))))
+                # Remove priority string from description only if it was successfully parsed
+                desc = desc.replace(priority_match.group(0), "").strip()
+            except ValueError:
+                priority = 1 # Fallback if parsing fails
+
+        # Remove extra 'recurring' word from description if present
+        if kind == "recurring":
+            desc = desc.replace("recurring", "").strip()
+
+        if not time_str:
+            # Interval rules may leave out the start; the first reminder is one interval from now
+            return {"action": "schedule", "desc": desc, "time": None, "recurring": recurring, "priority": priority}
+        time_match = resolve_time(time_str) # Just the time string, cached per phrase
+        if time_match is None:
+            return {"action": "unknown", "message": f"Couldn’t parse time '{time_str}'."}
+        return {"action": "schedule", "desc": desc, "time": time_match, "recurring": recurring, "priority": priority}
+
+    @staticmethod
+    def _feedback(match):
+        suggestion = match.group("feedback_suggestion").strip()
+        feedback_value_str = match.group("feedback_value")
+        feedback = 1 if "like" in feedback_value_str or "good" in feedback_value_str else -1 if "dislike" in feedback_value_str or "bad" in feedback_value_str else 0
+        # Remove 'response_text' from NLU result; ChattyAgent will craft it
+        return {"action": "feedback", "suggestion": suggestion, "feedback": feedback}
+
+    @staticmethod
+    def _review(match):
+        result = {"action": "review"}
+        if match.group("review_page"):
+            result["page"] = int(match.group("review_page"))
+        return result
 
-                    # Remove extra 'recurring' word from description if present
-                    if "recurring" in match.group(1):
-                        desc = desc.replace("recurring", "").strip()
+    @staticmethod
+    def _list(match):
+        result = {"action": "list"}
+        if match.group("list_due"):
+            result["due"] = match.group("list_due")
+        if match.group("list_page"):
+            result["page"] = int(match.group("list_page"))
+        return result
 
-                    try:
-                        parsed_time = parse(time_str, fuzzy=True)
-                        time_match = parsed_time.strftime("%H:%M") # Just the time string
-                        return {"action": "schedule", "desc": desc, "time": time_match, "recurring": "recurring" in command, "priority": priority}
-                    except ParserError:
-                        return {"action": "unknown", "message": f"Couldn’t parse time '{time_str}'."}
-                elif intent == "set_priority":
-                    return {"action": "set_priority", "task_time": match.group(1).strip(), "priority": int(match.group(3))}
-                elif intent == "feedback":
-                    suggestion = match.group(1).strip()
-                    feedback_value_str = match.group(3)
-                    feedback = 1 if "like" in feedback_value_str or "good" in feedback_value_str else -1 if "dislike" in feedback_value_str or "bad" in feedback_value_str else 0
-                    # Remove 'response_text' from NLU result; ChattyAgent will craft it
-                    return {"action": "feedback", "suggestion": suggestion, "feedback": feedback}
-                elif intent == "generate_blog":
-                    return {"action": "generate_blog"}
-                elif intent == "complete_task":
-                    return {"action": "complete", "identifier": match.group(1).strip()}
-                elif intent == "review_completed":
-                    return {"action": "review"}
-                elif intent == "list_tasks":
-                    return {"action": "list"}
-                elif intent == "clear_tasks":
-                    return {"action": "clear"}
-                elif intent == "exit":
-                    return {"action": "exit"}
-        return {"action": "unknown"}
\ No newline at end of file
+INTENT_HANDLERS = {
+    "greet": lambda match: {"action": "unknown"}, # The pattern loop never had a greet branch, so "hello" has always fallen through to unknown
+    "add_task": lambda match: {"action": "add", "desc": match.group("add_desc").strip()},
+    "schedule_task": NLUParser._schedule,
+    "set_priority": lambda match: {"action": "set_priority", "task_time": match.group("priority_task").strip(), "priority": int(match.group("priority_value"))},
+    "feedback": NLUParser._feedback,
+    "generate_blog": lambda match: {"action": "generate_blog"},
+    "complete_task": lambda match: {"action": "complete", "identifier": match.group("complete_identifier").strip()},
+    "review_completed": NLUParser._review,
+    "list_tasks": NLUParser._list,
+    "mail_status": lambda match: {"action": "mail_status"},
+    "clear_tasks": lambda match: {"action": "clear"},
+    "exit": lambda match: {"action": "exit"},
+}
@@ -0,0 +1,61 @@
+# recurrence.py
+from datetime import datetime, time as dt_time, timedelta
+from functools import lru_cache
+import re
+
+# Canonical rule strings, as stored in TaskRecord.recurring (False means a one-time task):
+# "daily", "weekly", "weekdays" (Monday-Friday) and "every N minutes".
+DAY_RULES = ("daily", "weekly", "weekdays")
+INTERVAL_PATTERN = re.compile(r"every (\d+) (minute|minutes|min|mins|hour|hours)")
+
+class RecurrenceRule:
+    """
+    A parsed recurrence rule. Occurrences are anchored on a task's current due time: day-based rules keep
+    its wall-clock time of day (and weekday, for weekly), interval rules keep its phase.
+    The next occurrence is computed directly from the rule, so catching up after any amount of downtime is O(1).
+    """
+    def __init__(self, name, minutes=None):
+        self.name = name
+        self.minutes = minutes # Interval length for "every N minutes" rules
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def parse(rule):
+        """Returns the RecurrenceRule for a canonical rule string. Raises ValueError for anything else."""
+        if rule in DAY_RULES:
+            return RecurrenceRule(rule)
+        match = INTERVAL_PATTERN.fullmatch(rule)
+        if match:
+            minutes = int(match.group(1)) * (60 if match.group(2).startswith("hour") else 1)
+            if minutes > 0:
+                return RecurrenceRule(f"every {minutes} minutes", minutes)
+        raise ValueError(f"unknown recurrence '{rule}' (use daily, weekly, weekdays or every N minutes/hours)")
+
+    def next_after(self, timestamp, after):
+        """First occurrence strictly after epoch `after`, for a task currently due at epoch `timestamp`."""
+        if self.minutes is not None:
+            period = self.minutes * 60
+            return timestamp + ((after - timestamp) // period + 1) * period
+        anchor = datetime.fromtimestamp(timestamp)
+        base = datetime.fromtimestamp(after)
+        time_of_day = dt_time(anchor.hour, anchor.minute, anchor.second)
+        day = base.date()
+        if self.name == "weekly":
+            day += timedelta(days=(anchor.weekday() - day.weekday()) % 7)
+        candidate = datetime.combine(day, time_of_day)
+        if candidate.timestamp() <= after:
+            candidate += timedelta(days=7 if self.name == "weekly" else 1)
+        if self.name == "weekdays" and candidate.weekday() >= 5:
+            candidate += timedelta(days=7 - candidate.weekday()) # Saturday/Sunday -> Monday
+        return int(candidate.timestamp())
+
+def normalize_rule(value):
+    """
+    Canonical form of a stored recurrence: False for one-time tasks, else a rule string.
+    Older state files (and the SQLite column) store plain booleans, which mean daily.
+    """
+    if value in (None, False, 0, "", "0", "false"):
+        return False
+    if value is True or value == 1 or value in ("1", "true", "recurring"):
+        return "daily"
+    return RecurrenceRule.parse(str(value).strip().lower()).name
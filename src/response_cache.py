@@ -0,0 +1,125 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+class ResponseCache:
+    """
+    Generated text kept on disk, keyed by (model, prompt, options), so a repeated prompt is answered
+    without running the model again. One JSON file per entry; entries older than ttl seconds are
+    ignored and removed, and once the files add up to more than max_bytes the least recently used go first.
+    The directory is only scanned on first use.
+    """
+    def __init__(self, directory, ttl=24 * 3600, max_bytes=5 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries = None # Key -> [created, last used, size in bytes]; None until the directory is scanned
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model, prompt, options=None):
+        return hashlib.sha256(json.dumps([model, prompt, options], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _scan(self):
+        self._entries = {}
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    created = json.load(f)["created"]
+                stat = entry.stat()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Dropping unreadable cache entry {entry.path}: {e}")
+                self._remove(entry.name[:-len(".json")])
+                continue
+            self._entries[entry.name[:-len(".json")]] = [created, stat.st_mtime, stat.st_size]
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, model, prompt, options=None):
+        """Returns the cached text, or None on a miss or an expired entry."""
+        key = self.key(model, prompt, options)
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self.expired += 1
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    response = json.load(f)["response"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: Dropping unreadable cache entry {self._path(key)}: {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[1] = time.time()
+            return response
+
+    def put(self, model, prompt, response, options=None):
+        key = self.key(model, prompt, options)
+        now = time.time()
+        data = json.dumps({"model": model, "prompt": prompt, "options": options, "response": response, "created": now}, ensure_ascii=False)
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = self._path(key) + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+            except OSError as e:
+                print(f"Warning: Could not write cache entry {self._path(key)}: {e}")
+                return
+            self._entries[key] = [now, now, len(data.encode("utf-8"))]
+            self._evict()
+
+    def _evict(self):
+        total = sum(entry[2] for entry in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k][1]): # Least recently used first
+            if total <= self.max_bytes:
+                break
+            total -= self._entries[key][2]
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries = self._entries or {}
+            return {"hits": self.hits, "misses": self.misses, "expired": self.expired, "evictions": self.evictions,
+                    "entries": len(entries), "bytes": sum(entry[2] for entry in entries.values())}
+
+    def clear(self):
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            for key in list(self._entries):
+                self._remove(key)
+            self.hits = self.misses = self.expired = self.evictions = 0
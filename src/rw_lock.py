@@ -0,0 +1,83 @@
+# rw_lock.py
+from contextlib import contextmanager
+import threading
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Waiting writers block new readers, so a steady stream of
+    listings cannot starve an alert check or a save.
+    Both sides are reentrant for the thread holding them (a writer may also read), which lets
+    locked methods call each other; upgrading a read to a write is refused instead of deadlocking.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0 # Threads currently holding the read side
+        self._writer = None # Thread holding the write side
+        self._write_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local() # Per-thread read depth
+
+    def _read_depth(self):
+        return getattr(self._local, "depth", 0)
+
+    def acquire_read(self):
+        me = threading.current_thread()
+        depth = self._read_depth()
+        if depth or self._writer is me: # Nested inside a read or write we already hold
+            self._local.depth = depth + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+
+    def release_read(self):
+        self._local.depth -= 1
+        if self._local.depth or self._writer is threading.current_thread():
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.current_thread()
+        if self._writer is me:
+            self._write_depth += 1
+            return
+        if self._read_depth():
+            raise RuntimeError("Cannot take the write lock while holding the read lock")
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        self._write_depth -= 1
+        if self._write_depth:
+            return
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
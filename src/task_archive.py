@@ -0,0 +1,81 @@
+# task_archive.py
+from datetime import datetime
+import gzip
+import json
+import os
+
+from task_record import TaskRecord
+
+class CompletedArchive:
+    """
+    Completed tasks rolled out of memory into gzip'd JSON-lines segments, one per month of the task timestamp.
+    Segments are only opened when completed tasks are listed, one at a time and in timestamp order,
+    so memory use does not depend on how much history has piled up.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._counts = {} # Segment file name -> number of tasks in it
+        if os.path.exists(self._manifest_path):
+            try:
+                with open(self._manifest_path, "r", encoding="utf-8") as f:
+                    self._counts = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not read archive manifest {self._manifest_path}: {e}. Rebuilding it from segments.")
+                self._counts = {name: None for name in os.listdir(directory) if name.endswith(".jsonl.gz")}
+
+    @staticmethod
+    def _segment_name(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime("completed-%Y-%m.jsonl.gz")
+
+    def _write_manifest(self):
+        temp_path = self._manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._counts, f)
+        os.replace(temp_path, self._manifest_path)
+
+    def append(self, records):
+        """
+        Appends records to their monthly segments (each append adds a gzip member, which readers concatenate).
+        A task already in its segment (re-archived after a crash) is written again but counted once.
+        """
+        segments = {}
+        for record in records:
+            segments.setdefault(self._segment_name(record.timestamp), []).append(record)
+        if not segments:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, segment_records in segments.items():
+            existing = {r.timestamp for r in self._read_segment(name)} if os.path.exists(os.path.join(self.directory, name)) else set()
+            with gzip.open(os.path.join(self.directory, name), "at", encoding="utf-8") as f:
+                for r in segment_records:
+                    f.write(json.dumps({"id": r.id, "desc": r.desc, "ts": r.timestamp, "completed_at": r.completed_at}, ensure_ascii=False) + "\n")
+            self._counts[name] = len(existing | {r.timestamp for r in segment_records}) # Distinct tasks, as records() yields them
+        self._write_manifest()
+
+    def _read_segment(self, name):
+        records = {} # One task per timestamp; a later line (e.g. re-archived after a crash) wins
+        with gzip.open(os.path.join(self.directory, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                records[entry["ts"]] = TaskRecord(entry["id"], entry["desc"], entry["ts"], completed_at=entry["completed_at"])
+        if self._counts.get(name) is None:
+            self._counts[name] = len(records)
+        return [records[t] for t in sorted(records)]
+
+    def records(self):
+        """Yields archived tasks ordered by timestamp, loading one monthly segment at a time."""
+        for name in sorted(self._counts): # "completed-YYYY-MM" names sort chronologically
+            yield from self._read_segment(name)
+
+    def count(self):
+        return sum(count or 0 for count in self._counts.values())
+
+    def clear(self):
+        for name in self._counts:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._counts = {}
+        if os.path.exists(self._manifest_path):
+            os.remove(self._manifest_path)
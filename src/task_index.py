@@ -0,0 +1,54 @@
+# task_index.py
+from collections import defaultdict
+
+class TrigramIndex:
+    """
+    Incrementally maintained trigram index for partial-match lookups.
+    Maps every 3-character substring of an entry's text to the set of keys containing it, so a query
+    only has to verify the keys found in all of its trigrams' posting sets instead of scanning everything.
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+
+    @classmethod
+    def _grams(cls, text):
+        return {text[i:i + cls.GRAM_SIZE] for i in range(len(text) - cls.GRAM_SIZE + 1)}
+
+    def add(self, key, text):
+        for gram in self._grams(text):
+            self._postings[gram].add(key)
+
+    def remove(self, key, text):
+        for gram in self._grams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[gram]
+
+    def clear(self):
+        self._postings.clear()
+
+    def candidates(self, query):
+        """
+        Returns the keys whose text may contain query (callers still verify the match),
+        or None if the query is shorter than a trigram and cannot use the index.
+        """
+        grams = self._grams(query)
+        if not grams:
+            return None
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len) # Intersect starting from the rarest trigram
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
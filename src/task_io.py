@@ -0,0 +1,119 @@
+# task_io.py
+import csv
+from datetime import datetime
+import json
+import os
+
+from recurrence import normalize_rule
+from task_record import TIMESTAMP_FORMAT
+from task_store import KINDS
+
+# Columns of an exported row; imports accept the same names (only desc and time are required)
+FIELDS = ("kind", "desc", "time", "recurring", "priority", "completed_at")
+TIME_FORMATS = (TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M")
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"", "0", "false", "no", "n"}
+
+def file_format(path):
+    """'csv' or 'jsonl', from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Unsupported task file '{path}': use a .csv or .jsonl file")
+
+def read_rows(path):
+    """Streams (line number, row dict) pairs from a CSV file with a header row or a JSON-lines file."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if file_format(path) == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, ValueError(f"invalid JSON: {e}")
+                    continue
+                yield line_number, row if isinstance(row, dict) else ValueError("expected a JSON object")
+
+def _parse_time(value, name):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) # Epoch seconds
+    value = str(value).strip()
+    try:
+        return int(datetime.fromisoformat(value).timestamp()) # Covers every TIME_FORMATS layout, far faster than strptime
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return int(datetime.strptime(value, time_format).timestamp())
+        except ValueError:
+            pass
+    raise ValueError(f"{name} '{value}' is not 'YYYY-MM-DD HH:MM[:SS]'")
+
+def _parse_recurring(value):
+    """False, or a rule string: true/yes mean daily, as in older state files."""
+    if isinstance(value, bool):
+        return normalize_rule(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return "daily"
+    if text in FALSE_VALUES:
+        return False
+    try:
+        return normalize_rule(text)
+    except ValueError:
+        raise ValueError(f"recurring '{value}' is not true/false, daily, weekly, weekdays or every N minutes")
+
+def parse_row(row):
+    """
+    Validates one imported row and returns (kind, desc, epoch, recurring, priority, completed_at).
+    Raises ValueError naming the bad field. Priorities are clamped to 1-5 like chat commands.
+    """
+    if isinstance(row, Exception):
+        raise row
+    kind = str(row.get("kind") or "tasks").strip().lower()
+    if kind not in KINDS:
+        raise ValueError(f"kind '{kind}' is not one of {', '.join(KINDS)}")
+    desc = str(row.get("desc") or "").strip()
+    if not desc:
+        raise ValueError("desc is empty")
+    if row.get("time") in (None, ""):
+        raise ValueError("time is missing")
+    timestamp = _parse_time(row["time"], "time")
+    recurring = _parse_recurring(row.get("recurring") or False)
+    if recurring and kind != "scheduled":
+        raise ValueError("only scheduled tasks can recur")
+    try:
+        priority = max(1, min(5, int(row.get("priority") or 1)))
+    except (TypeError, ValueError):
+        raise ValueError(f"priority '{row.get('priority')}' is not a number")
+    completed_at = None
+    if kind == "completed":
+        completed_at = _parse_time(row["completed_at"], "completed_at") if row.get("completed_at") not in (None, "") else timestamp
+    return kind, desc, timestamp, recurring, priority, completed_at
+
+def write_rows(path, rows):
+    """Writes (kind, record) pairs to a CSV or JSON-lines file as they come. Returns the number written."""
+    as_csv = file_format(path) == "csv"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f) if as_csv else None
+        if as_csv:
+            writer.writerow(FIELDS)
+        for kind, record in rows:
+            completed_at = datetime.fromtimestamp(record.completed_at).strftime(TIMESTAMP_FORMAT) if record.completed_at is not None else None
+            values = (kind, record.desc, record.key, record.recurring, record.priority, completed_at)
+            if as_csv:
+                writer.writerow(values)
+            else:
+                f.write(json.dumps(dict(zip(FIELDS, values)), ensure_ascii=False) + "\n")
+            written += 1
+    return written
@@ -0,0 +1,114 @@
+# task_journal.py
+import json
+import os
+import time
+
+class TaskJournal:
+    """
+    Append-only log of TaskManager operations, one JSON object per line.
+    Every entry carries a sequence number ("seq"); a snapshot records the last seq it contains,
+    so replaying the log on top of it skips entries that are already reflected there.
+    Lines are flushed to the OS immediately (surviving a process crash) and fsync'ed in batches.
+    """
+    def __init__(self, path, fsync_batch=32, fsync_interval=1.0):
+        self.path = path
+        self.rotated_path = path + ".old" # Log being folded into a snapshot by compaction
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.seq = 0 # Sequence number of the last entry written or replayed
+        self.entries_since_snapshot = 0
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def _read_entries(path):
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Only a torn final write is expected here; anything after it is unreliable too
+                    print(f"Warning: Ignoring unreadable journal entry at {path}:{line_number} and everything after it.")
+                    break
+        return entries
+
+    def replay(self, apply_entry, after_seq=0):
+        """Feeds every entry newer than after_seq (rotated log first) to apply_entry. Returns the count applied."""
+        self.seq = after_seq
+        applied = 0
+        for path in (self.rotated_path, self.path):
+            for entry in self._read_entries(path):
+                if entry.get("seq", 0) <= self.seq:
+                    continue
+                apply_entry(entry)
+                self.seq = entry["seq"]
+                applied += 1
+        return applied
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, op, **fields):
+        if self._file is None:
+            return
+        self.seq += 1
+        self.entries_since_snapshot += 1
+        self._file.write(json.dumps({"seq": self.seq, "op": op, **fields}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self.sync()
+        else:
+            self.sync_if_due()
+
+    def sync_if_due(self):
+        """Fsyncs once fsync_interval has passed since the last sync; meant to be called from a periodic loop too."""
+        if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Forces pending entries to disk. Cheap to call often; it does nothing when there is nothing to sync."""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def rotate(self):
+        """Moves the live log aside for compaction and starts a fresh one. Returns False if a rotation is still pending."""
+        if os.path.exists(self.rotated_path):
+            return False
+        self.sync()
+        self._file.close()
+        os.replace(self.path, self.rotated_path)
+        self.open()
+        self.entries_since_snapshot = 0
+        return True
+
+    def discard_rotated(self):
+        """Called once a snapshot containing the rotated log has been safely written."""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def truncate(self):
+        """Empties the journal after a full snapshot has been written."""
+        self.discard_rotated()
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._unsynced = 0
+        self.entries_since_snapshot = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
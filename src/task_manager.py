@@ -1,201 +1,296 @@
 # task_manager.py
 from collections import defaultdict
+import heapq
 import json
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 import re # Import re for regular expressions
+from functools import wraps
+
+from alert_dedup import AlertDedup
+from habit_scorer import HabitScorer
+from recurrence import RecurrenceRule, normalize_rule
+from rw_lock import ReadWriteLock
+from task_io import parse_row, read_rows, write_rows
+from task_journal import TaskJournal
+from task_record import TIMESTAMP_FORMAT, to_epoch
+from task_store import KINDS, MemoryTaskStore
+
+def _reader(method):
+    """Runs method under the shared side of the TaskManager lock (listings, counts, snapshots)."""
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+def _writer(method):
+    """Runs method under the exclusive side, so a multi-step change is never seen half-done."""
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.write():
+            return method(self, *args, **kwargs)
+    return locked
 
 class TaskManager:
-    def __init__(self):
-        self.tasks = {} # Ad-hoc tasks
-        self.scheduled_tasks = {} # Scheduled tasks
-        self.completed_tasks = {} # Completed tasks
+    """
+    Safe to share between threads: listings and counts run concurrently under a read lock,
+    while every change (including the whole due-check/reschedule pass and saving) holds the write lock.
+    """
+    def __init__(self, store=None):
+        self.store = store if store is not None else MemoryTaskStore() # Where tasks live, see task_store.py
         self.task_history = defaultdict(int) # History for suggestions
         self.feedback_history = defaultdict(int) # Feedback for suggestions
-        self.last_notified = {} # To prevent repeated alerts
+        self.habits = HabitScorer() # Decayed, feedback-weighted history with an incrementally kept best task
+        self.last_notified = AlertDedup() # To prevent repeated alerts; forgets each alert once its minute/day is over
+        self.journal = None # Optional TaskJournal, see enable_journal
+        self.journal_compact_threshold = 500 # Journal entries before a background compaction
+        self._snapshot_path = None
+        self._snapshot_seq = 0 # Last journal entry contained in the loaded snapshot
+        self._compaction_thread = None
+        self._meta_dirty = False
+        self.archive_roll_interval = 3600 # Seconds between archive rollovers in sync_state
+        self._last_archive_roll = 0
+        self._lock = ReadWriteLock()
 
+    @_writer
     def add_task(self, desc, timestamp):
-        self.tasks[timestamp] = desc
+        record = self.store.add("tasks", desc, to_epoch(timestamp))
         self.task_history[desc.lower()] += 1
+        self.habits.record(desc.lower(), record.timestamp)
+        self._log("add", desc=desc, ts=record.key)
         return f"Yay! Added task: {desc} at {timestamp}!" # Return response text
 
+    @_writer
     def schedule_task(self, desc, scheduled_datetime, recurring, priority):
-        timestamp_key = scheduled_datetime.strftime("%Y-%m-%d %H:%M:%S")
         # Clean desc from priority string if present, as it was already parsed by NLU
         cleaned_desc = desc
         priority_match = re.search(r"\(priority:(\d+)\)", cleaned_desc, re.IGNORECASE)
         if priority_match:
             cleaned_desc = cleaned_desc.replace(priority_match.group(0), "").strip()
 
-        self.scheduled_tasks[timestamp_key] = {"desc": cleaned_desc, "recurring": recurring, "priority": priority}
-        return f"Woo-hoo! Scheduled '{cleaned_desc}' (Priority: {priority}) for {scheduled_datetime.strftime('%Y-%m-%d %H:%M')}!"
+        recurring = normalize_rule(recurring) # False, or a rule string; plain True means daily
+        timestamp = to_epoch(scheduled_datetime)
+        if recurring:
+            # Start on the first occurrence of the rule at or after the requested time (e.g. a weekday)
+            timestamp = RecurrenceRule.parse(recurring).next_after(timestamp, timestamp - 1)
+        record = self.store.add("scheduled", cleaned_desc, timestamp, recurring, priority)
+        self._log("schedule", desc=cleaned_desc, ts=record.key, recurring=recurring, priority=priority)
+        repeats = f", repeating {recurring}" if recurring else ""
+        return f"Woo-hoo! Scheduled '{cleaned_desc}' (Priority: {priority}{repeats}) for {record.datetime.strftime('%Y-%m-%d %H:%M')}!"
 
+    @_writer
     def complete_task(self, identifier):
-        found_task_data = None
-        original_timestamp = None
-
-        # Check ad-hoc tasks first
-        for timestamp in list(self.tasks.keys()):
-            if identifier.lower() in timestamp.lower() or identifier.lower() in self.tasks[timestamp].lower():
-                found_task_data = {"desc": self.tasks.pop(timestamp), "timestamp": timestamp}
-                original_timestamp = timestamp
-                break
-
-        # If not found in ad-hoc, check scheduled tasks
-        if not found_task_data:
-            for timestamp in list(self.scheduled_tasks.keys()):
-                task_data = self.scheduled_tasks.get(timestamp)
-                if task_data and (identifier.lower() in timestamp.lower() or identifier.lower() in task_data["desc"].lower()):
-                    found_task_data = {"desc": self.scheduled_tasks.pop(timestamp)["desc"], "timestamp": timestamp}
-                    original_timestamp = timestamp
-                    break
-
-        if found_task_data:
-            desc = found_task_data["desc"]
-            self.completed_tasks[original_timestamp] = desc
-            self.task_history[desc.lower()] += 1
-            return desc, original_timestamp # Return desc and its original timestamp
+        identifier = identifier.lower()
+
+        # Check ad-hoc tasks first, then scheduled tasks
+        for source in ("tasks", "scheduled"):
+            found = self.store.find(source, identifier)
+            if found:
+                self._complete_record(source, found)
+                self._log("complete", source=source, ts=found.key, at=found.completed_at)
+                return found.desc, found.key # Return desc and its original timestamp
         return None, None # Indicate no task found
 
+    def _complete_record(self, source, record, completed_at=None):
+        completed_at = int(time.time()) if completed_at is None else completed_at
+        self.store.complete(source, record, completed_at)
+        self.task_history[record.desc.lower()] += 1
+        self.habits.record(record.desc.lower(), completed_at)
+
+    @_writer
     def set_priority(self, task_identifier, new_priority):
         # Allow setting priority by partial match on description or timestamp
-        for timestamp in list(self.scheduled_tasks.keys()):
-            task_data = self.scheduled_tasks.get(timestamp)
-            if task_data and (task_identifier.lower() in timestamp.lower() or task_identifier.lower() in task_data["desc"].lower()):
-                task_data["priority"] = new_priority
-                return task_data["desc"], timestamp # Return description and timestamp of updated task
+        record = self.store.find("scheduled", task_identifier.lower())
+        if record:
+            self.store.set_priority(record, new_priority)
+            self._log("priority", ts=record.key, priority=new_priority)
+            return record.desc, record.key # Return description and timestamp of updated task
         return None, None # Indicate no task found
 
+    @_writer
+    def record_feedback(self, suggestion, feedback):
+        self.feedback_history[suggestion.lower()] += int(feedback)
+        self.habits.set_feedback(suggestion.lower(), self.feedback_history[suggestion.lower()])
+        self._log("feedback", suggestion=suggestion, feedback=int(feedback))
+
+    @_writer
     def clear_tasks(self):
-        self.tasks.clear()
-        self.scheduled_tasks.clear()
-        self.completed_tasks.clear()
+        self.store.clear()
         self.task_history.clear()
         self.feedback_history.clear()
+        self.habits.clear()
+        self._log("clear")
         # No return value needed, ChattyAgent will craft the response
 
+    @_reader
     def get_completed_tasks_display(self): # New method to return display string
-        if self.completed_tasks:
-            return "Completed tasks:\n" + "\n".join(f"- {t}: {d}" for t, d in sorted(self.completed_tasks.items()))
+        if self.store.count("completed"):
+            return "Completed tasks:\n" + self._format_completed()
         else:
             return "No tasks completed yet!"
 
+    def _format_completed(self):
+        return "\n".join(f"- {r.key}: {r.desc}" for r in self.store.records("completed", ordered=True))
+
+    @staticmethod
+    def _format_active(record, kind):
+        if kind == "scheduled":
+            return f"- {record.key}: {record.desc} (Priority: {record.priority})"
+        return f"- {record.key}: {record.desc}"
+
+    @_reader
     def get_all_tasks_display(self): # New method to return display string
-        active_list_items = []
-        for t, d in self.tasks.items():
-            active_list_items.append(f"- {t}: {d}")
-        # Make sure to format scheduled tasks consistently
-        for t, v in self.scheduled_tasks.items():
-            active_list_items.append(f"- {t}: {v['desc']} (Priority: {v.get('priority', 1)})")
+        # Both kinds come back sorted by timestamp, so a merge keeps the combined list in order
+        active_list_items = [self._format_active(r, kind) for r, kind in heapq.merge(
+            ((r, "tasks") for r in self.store.records("tasks", ordered=True)),
+            ((r, "scheduled") for r in self.store.records("scheduled", ordered=True)),
+            key=lambda item: item[0].timestamp)]
+        has_completed = self.store.count("completed") > 0
 
-        active_display = "Your tasks:\n" + "\n".join(sorted(active_list_items)) if active_list_items else ""
+        active_display = "Your tasks:\n" + "\n".join(active_list_items) if active_list_items else ""
 
         completed_display = ""
-        if self.completed_tasks:
-            completed_display = "\nCompleted tasks:\n" + "\n".join(f"- {t}: {d}" for t, d in sorted(self.completed_tasks.items()))
+        if has_completed:
+            completed_display = "\nCompleted tasks:\n" + self._format_completed()
 
-        if not active_list_items and not self.completed_tasks:
+        if not active_list_items and not has_completed:
             return "No tasks yet—give me something to do!"
-        
+
         return active_display + completed_display
 
+    @_reader
+    def task_count(self, kinds=KINDS):
+        return sum(self.store.count(kind) for kind in kinds)
+
+    @_reader
+    def get_tasks_page(self, page=1, page_size=10, due_today=False):
+        """One page of active tasks (or of scheduled tasks due today); only that page is formatted."""
+        page = max(1, page)
+        offset = (page - 1) * page_size
+        if due_today:
+            today_start = datetime.combine(datetime.now().date(), datetime.min.time())
+            items, total = self.store.page(("scheduled",), offset, page_size,
+                                           to_epoch(today_start), to_epoch(today_start + timedelta(days=1)))
+            return self._format_page("Due today", items, total, page, page_size, "list tasks due today", "Nothing scheduled for today!")
+        items, total = self.store.page(("tasks", "scheduled"), offset, page_size)
+        completed = self.store.count("completed")
+        if not total and not completed:
+            return "No tasks yet—give me something to do!"
+        text = self._format_page("Your tasks", items, total, page, page_size, "list tasks", "No open tasks.")
+        if completed and (not total or (items and offset + len(items) >= total)): # After the last page, as in the unpaged list
+            if completed <= page_size:
+                text += "\nCompleted tasks:\n" + self._format_completed()
+            else:
+                text += f"\nCompleted tasks: {completed} (say 'review completed' to see them)."
+        return text
+
+    @_reader
+    def get_completed_page(self, page=1, page_size=10):
+        page = max(1, page)
+        items, total = self.store.page(("completed",), (page - 1) * page_size, page_size)
+        return self._format_page("Completed tasks", items, total, page, page_size, "review completed", "No tasks completed yet!")
+
+    def _format_page(self, title, items, total, page, page_size, command, empty_message):
+        if not total:
+            return empty_message
+        pages = (total + page_size - 1) // page_size
+        if not items:
+            return f"There is no page {page}; {command} has {pages} page(s)."
+        lines = [f"{title} (page {page}/{pages}, {total} total):"]
+        lines.extend(self._format_active(record, kind) for kind, record in items)
+        if page < pages:
+            lines.append(f"Say '{command} page {page + 1}' for more.")
+        return "\n".join(lines)
+
+    @_writer
     def check_and_update_scheduled_tasks(self):
         """
         Checks scheduled tasks, updates recurring tasks, and returns alert messages.
         This method manages task data only, not UI or sounds.
+        Only tasks the store reports as due are examined (a deadline heap or an indexed query),
+        so a tick costs O(k log n) for k due tasks.
         """
         current_datetime = datetime.now()
         alerts = []
-        
-        for timestamp_key in list(self.scheduled_tasks.keys()):
-            task_data = self.scheduled_tasks.get(timestamp_key)
-            if not task_data:
-                continue
 
-            try:
-                scheduled_dt = datetime.strptime(timestamp_key, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                print(f"Warning: Invalid timestamp format for '{timestamp_key}'. Removing task from scheduled_tasks.")
-                del self.scheduled_tasks[timestamp_key]
-                continue
-            
-            # Use a fine-grained key for last_notified to avoid over-alerting
-            alert_check_key = f"{timestamp_key}-{current_datetime.strftime('%Y%m%d%H%M')}" 
-            
-            # Check if current time is past or equal to scheduled time
-            # And if we haven't already notified for this exact minute (for non-recurring) or day (for recurring)
-            has_alerted_recently = False
-            if task_data["recurring"]:
-                # For recurring, check if already alerted today for this task key
-                if timestamp_key in self.last_notified and self.last_notified[timestamp_key].get("last_alert_day") == current_datetime.date().strftime("%Y-%m-%d"):
-                    has_alerted_recently = True
+        # The due list is fixed before anything is rescheduled. A recurring task moves straight to its
+        # first occurrence after now, so after downtime it fires once instead of once per missed day.
+        now = int(current_datetime.timestamp())
+        self.last_notified.evict(now)
+        due_records = self.store.due(now)
+        if not due_records:
+            return alerts
+
+        current_day = current_datetime.strftime("%Y-%m-%d")
+        current_minute = current_datetime.strftime("%Y-%m-%d %H:%M")
+        for record in due_records:
+            timestamp_key = record.key
+            scheduled_dt = record.datetime
+
+            # Check if we haven't already notified for this exact minute (for non-recurring) or day (for recurring)
+            if record.recurring:
+                has_alerted_recently = self.last_notified.alerted(timestamp_key, day=current_day)
             else:
-                # For one-time, check if alerted at this specific minute for this task key
-                if timestamp_key in self.last_notified and self.last_notified[timestamp_key].get("last_alert_minute") == current_datetime.strftime("%Y-%m-%d %H:%M"):
-                    has_alerted_recently = True
-
-            if current_datetime >= scheduled_dt and not has_alerted_recently:
-                alert_message = f"⏰ Alert! Time to {task_data['desc']} at {scheduled_dt.strftime('%Y-%m-%d %H:%M')}"
-                alerts.append(alert_message)
-                
-                # Update last_notified record
-                if timestamp_key not in self.last_notified:
-                    self.last_notified[timestamp_key] = {}
-                
-                if task_data["recurring"]:
-                    self.last_notified[timestamp_key]["last_alert_day"] = current_datetime.date().strftime("%Y-%m-%d")
-                    
-                    # Schedule for next day
-                    new_scheduled_dt = scheduled_dt + timedelta(days=1)
-                    new_timestamp_key = new_scheduled_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    self.scheduled_tasks[new_timestamp_key] = task_data
-                    del self.scheduled_tasks[timestamp_key] # Remove old key
-                    print(f"Rescheduled recurring task '{task_data['desc']}' for {new_scheduled_dt.strftime('%Y-%m-%d %H:%M')}.")
-                else:
-                    self.last_notified[timestamp_key]["last_alert_minute"] = current_datetime.strftime("%Y-%m-%d %H:%M")
-                    del self.scheduled_tasks[timestamp_key] # Remove one-time task
-                    print(f"One-time task '{task_data['desc']}' completed and removed from scheduled.")
+                has_alerted_recently = self.last_notified.alerted(timestamp_key, minute=current_minute)
+
+            if has_alerted_recently:
+                continue # Still due; look again next tick
+
+            alerts.append(f"⏰ Alert! Time to {record.desc} at {scheduled_dt.strftime('%Y-%m-%d %H:%M')}")
+            next_timestamp = RecurrenceRule.parse(record.recurring).next_after(record.timestamp, now) if record.recurring else None
+            self._fire(record, current_day, current_minute, next_timestamp)
+            self._log("alert", ts=timestamp_key, day=current_day, minute=current_minute, next=record.key if next_timestamp is not None else None) # record.key is the new due time by now
         return alerts
 
+    def _fire(self, record, current_day, current_minute, next_timestamp=None):
+        """Records the alert and moves a recurring task to next_timestamp (default: a day later) or drops a one-time task."""
+        timestamp_key = record.key
+        scheduled_dt = record.datetime
+
+        if record.recurring:
+            self.last_notified.mark(timestamp_key, day=current_day)
+
+            # Move to the next occurrence; journals from before recurrence rules only ever stepped a day
+            new_scheduled_dt = datetime.fromtimestamp(next_timestamp) if next_timestamp is not None else scheduled_dt + timedelta(days=1)
+            self.store.reschedule(record, to_epoch(new_scheduled_dt))
+            print(f"Rescheduled recurring task '{record.desc}' for {new_scheduled_dt.strftime('%Y-%m-%d %H:%M')}.")
+        else:
+            self.last_notified.mark(timestamp_key, minute=current_minute)
+            self.store.remove("scheduled", record) # Remove one-time task
+            print(f"One-time task '{record.desc}' completed and removed from scheduled.")
+
+    @_writer # Reading the best habit drops stale heap entries
     def suggest_task(self): # Now this method belongs to TaskManager
         current_time = datetime.now()
-        suggestions = []
-        for timestamp, task_data in self.scheduled_tasks.items():
-            try:
-                scheduled_dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                continue # Skip malformed timestamps
-
-            time_diff = (scheduled_dt - current_time).total_seconds() / 60
-            if 0 < time_diff <= 120: # Tasks due in next 2 hours
-                urgency = max(1, 120 - time_diff) # More urgent closer to now
-                priority_score = urgency * task_data["priority"]
-                suggestions.append((priority_score, f"Schedule {task_data['desc']} at {scheduled_dt.strftime('%H:%M')} (in {int(time_diff)} minutes, Priority: {task_data['priority']})"))
-        
-        if suggestions:
-            suggestions.sort(key=lambda x: x[0], reverse=True) # Sort by priority score
-            return suggestions[0][1]
-
-        if self.task_history:
-            adjusted_history = {}
-            for task, frequency in self.task_history.items():
-                feedback = self.feedback_history.get(task.lower(), 0)
-                # Adjust score based on feedback: positive feedback increases likelihood, negative decreases
-                adjusted_score = frequency * (1 + feedback) # Feedback of 1 makes it 2x, -1 makes it 0x
-                if adjusted_score > 0: # Only suggest tasks with positive adjusted score
-                    adjusted_history[task] = adjusted_score
-            
-            if adjusted_history:
-                most_frequent_task = max(adjusted_history.items(), key=lambda x: x[1])[0]
-                
-                # Suggest for the next hour, handling day rollover
-                suggested_time_dt = current_time.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-                # If the calculated next hour is earlier than now (e.g., 23:00 -> 00:00), it means it's the next day
-                if suggested_time_dt.hour < current_time.hour: # Check if hour wrapped around midnight
-                    suggested_time_dt += timedelta(days=1)
-
-                return f"Based on your habits, how about scheduling {most_frequent_task} at {suggested_time_dt.strftime('%H:%M')}? (Provide feedback with 'feedback:{most_frequent_task} on like/good' or 'dislike/bad')"
-        
+        now = time.time()
+        best = None
+        # Only tasks due in the next 2 hours come back from the due-time index
+        for record in self.store.due_between(now, now + 120 * 60):
+            time_diff = (record.timestamp - now) / 60
+            urgency = max(1, 120 - time_diff) # More urgent closer to now
+            priority_score = urgency * record.priority
+            if best is None or priority_score > best[0]:
+                best = (priority_score, record, time_diff)
+
+        if best:
+            _, record, time_diff = best
+            return f"Schedule {record.desc} at {record.datetime.strftime('%H:%M')} (in {int(time_diff)} minutes, Priority: {record.priority})"
+
+        # Habit scores decay over time and are weighted by feedback (1 makes it 2x, -1 makes it 0x);
+        # the scorer keeps its best candidate current as tasks and feedback come in
+        most_frequent_task = self.habits.best()
+        if most_frequent_task:
+            # Suggest for the next hour, handling day rollover
+            suggested_time_dt = current_time.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            # If the calculated next hour is earlier than now (e.g., 23:00 -> 00:00), it means it's the next day
+            if suggested_time_dt.hour < current_time.hour: # Check if hour wrapped around midnight
+                suggested_time_dt += timedelta(days=1)
+
+            return f"Based on your habits, how about scheduling {most_frequent_task} at {suggested_time_dt.strftime('%H:%M')}? (Provide feedback with 'feedback:{most_frequent_task} on like/good' or 'dislike/bad')"
+
         # Default time-based suggestions
         current_hour = current_time.hour
         if 12 <= current_hour < 14:
@@ -206,37 +301,265 @@ class TaskManager:
             return "Don't forget to schedule your bedtime routine around 22:00?"
         return "No specific suggestions right now—add your own task!"
 
-    def save_state(self, file_path):
+    def _meta_dict(self):
+        return {
+            "task_history": dict(self.task_history),
+            "feedback_history": dict(self.feedback_history),
+            "last_notified": self.last_notified.to_dict(), # Only alerts from the current minute/day
+            "habit_scores": self.habits.to_dict()
+        }
+
+    @_reader
+    def to_dict(self):
+        """Returns the state in the JSON file format (timestamp strings as keys, task IDs kept alongside under task_ids)."""
+        records = {"tasks": list(self.store.records("tasks")), "scheduled_tasks": list(self.store.records("scheduled")),
+                   "completed_tasks": list(self.store.records("completed", include_archived=False))} # Archived ones stay in their segments
+        return {
+            "tasks": {r.key: r.desc for r in records["tasks"]},
+            "scheduled_tasks": {r.key: {"desc": r.desc, "recurring": r.recurring, "priority": r.priority} for r in records["scheduled_tasks"]},
+            "completed_tasks": {r.key: r.desc for r in records["completed_tasks"]},
+            "task_ids": {name: {r.key: r.id for r in kind_records} for name, kind_records in records.items()},
+            "next_task_id": self.store.next_id,
+            **self._meta_dict()
+        }
+
+    def _load_collection(self, kind, entries, name, ids):
+        """Parses each timestamp key exactly once into the store; malformed keys are dropped."""
+        for timestamp_key, value in entries.items():
+            try:
+                timestamp = to_epoch(timestamp_key)
+            except ValueError:
+                print(f"Warning: Invalid timestamp format for '{timestamp_key}'. Removing task from {name}.")
+                continue
+            task_id = ids.get(timestamp_key) # Files from before IDs were saved get fresh ones in file order
+            if isinstance(value, dict):
+                self.store.add(kind, value["desc"], timestamp, value.get("recurring", False), value.get("priority", 1), task_id=task_id)
+            else:
+                # The JSON file does not keep completion times, so the task's own timestamp stands in
+                self.store.add(kind, value, timestamp, completed_at=timestamp if kind == "completed" else None, task_id=task_id)
+
+    def _load_meta(self, data):
+        self.task_history = defaultdict(int, data.get("task_history", {}))
+        self.feedback_history = defaultdict(int, data.get("feedback_history", {}))
+        self.last_notified.load(data.get("last_notified", {})) # Expired entries are dropped
+        self.habits.load(self.task_history, self.feedback_history, data.get("habit_scores"))
+
+    @_writer
+    def from_dict(self, data):
+        with self.store.batch():
+            self.store.clear(include_archived=False) # Archive segments are not part of the JSON file
+            ids = data.get("task_ids", {})
+            self._load_collection("tasks", data.get("tasks", {}), "tasks", ids.get("tasks", {}))
+            self._load_collection("scheduled", data.get("scheduled_tasks", {}), "scheduled_tasks", ids.get("scheduled_tasks", {}))
+            self._load_collection("completed", data.get("completed_tasks", {}), "completed_tasks", ids.get("completed_tasks", {}))
+            if not self.store.persistent:
+                # Also covers archived tasks, whose IDs are not in the file; journal replay then reassigns the same IDs in order
+                self.store.next_id = max(self.store.next_id, data.get("next_task_id", 1))
+        self._load_meta(data)
+        self._snapshot_seq = data.get("journal_seq", 0)
+
+    @staticmethod
+    def _write_snapshot(file_path, data):
+        # Write to a temp file and swap it in, so a crash mid-write never leaves a truncated state file
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+
+    @_writer
+    def save_state(self, file_path):
+        if self.store.persistent:
+            # Tasks are already committed; only the small bookkeeping state needs writing
+            try:
+                self.store.save_meta(self._meta_dict())
+                self._meta_dirty = False
+                print(f"Saved tasks and history to {self.store.path}")
+            except Exception as e:
+                print(f"Error saving tasks: {e}")
+            return
+        if self._compaction_thread is not None:
+            self._compaction_thread.join() # Never let an older background snapshot land after this one
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump({
-                    "tasks": self.tasks,
-                    "scheduled_tasks": self.scheduled_tasks,
-                    "completed_tasks": self.completed_tasks,
-                    "task_history": dict(self.task_history),
-                    "feedback_history": dict(self.feedback_history),
-                    "last_notified": self.last_notified # Save last_notified as well
-                }, f, indent=4)
+            data = self.to_dict()
+            if self.journal is not None:
+                data["journal_seq"] = self.journal.seq
+            self._write_snapshot(file_path, data)
+            if self.journal is not None and file_path == self._snapshot_path:
+                self.journal.truncate() # Everything journaled so far is in the snapshot now
             print(f"Saved tasks and history to {file_path}")
         except Exception as e:
             print(f"Error saving tasks: {e}")
 
+    @_writer
     def load_state(self, file_path):
+        if self.store.persistent:
+            meta = self.store.load_meta()
+            self._load_meta(meta)
+            # The JSON file is imported once, ever: an empty store (say after 'clear tasks') must not bring it back.
+            # Stores filled before the flag existed count as imported.
+            if meta.get("json_imported") or any(self.store.count(kind) for kind in KINDS) or not os.path.exists(file_path):
+                if not meta.get("json_imported"):
+                    self.store.save_meta({"json_imported": True})
+                print(f"Opened task store {self.store.path}")
+                return
+            print(f"Importing {file_path} into {self.store.path}")
         if os.path.exists(file_path):
             try:
                 with open(file_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.tasks = data.get("tasks", {})
-                    self.scheduled_tasks = data.get("scheduled_tasks", {})
-                    self.completed_tasks = data.get("completed_tasks", {})
-                    self.task_history = defaultdict(int, data.get("task_history", {}))
-                    self.feedback_history = defaultdict(int, data.get("feedback_history", {}))
-                    self.last_notified = data.get("last_notified", {}) # Load last_notified
+                    self.from_dict(json.load(f))
+                if self.store.persistent:
+                    self.store.save_meta({**self._meta_dict(), "json_imported": True})
                 print(f"Loaded tasks and history from {file_path}")
             except json.JSONDecodeError as e:
                 print(f"Error loading tasks: Invalid JSON. Starting fresh. Error: {e}")
             except Exception as e:
                 print(f"Unexpected error loading tasks: {e}. Starting fresh.")
         else:
-            print(f"No task file found at {file_path}. Starting fresh.")
\ No newline at end of file
+            print(f"No task file found at {file_path}. Starting fresh.")
+
+    @_writer
+    def import_tasks(self, file_path, max_warnings=10):
+        """
+        Bulk-loads tasks from a CSV or JSON-lines file (columns as in task_io.FIELDS) as one store batch.
+        Bad rows are reported (the first max_warnings of them) and skipped; a row replaces any task of the
+        same kind at the same time, as in the JSON file. Rows are not journaled one by one: the result is
+        persisted once at the end (a snapshot, or the store's own commit). Returns (imported, skipped).
+        """
+        imported = skipped = 0
+        history = [] # (desc, time) of imported ad-hoc/completed tasks, applied once the batch has gone in
+        try:
+            with self.store.batch():
+                for line_number, row in read_rows(file_path):
+                    try:
+                        kind, desc, timestamp, recurring, priority, completed_at = parse_row(row)
+                    except ValueError as e:
+                        skipped += 1
+                        if skipped <= max_warnings:
+                            print(f"Warning: Skipping {file_path}:{line_number}: {e}")
+                        continue
+                    self.store.add(kind, desc, timestamp, recurring, priority, completed_at)
+                    if kind != "scheduled":
+                        history.append((desc.lower(), completed_at or timestamp))
+                    imported += 1
+        except Exception as e:
+            print(f"Error importing tasks from {file_path}: {e}")
+            if self.store.persistent:
+                return 0, skipped # The batch was rolled back
+        for desc, at in history:
+            self.task_history[desc] += 1
+            self.habits.record(desc, at)
+        if skipped > max_warnings:
+            print(f"Warning: {skipped - max_warnings} more bad rows skipped.")
+        print(f"Imported {imported} tasks from {file_path} ({skipped} skipped).")
+        if imported and (self.store.persistent or self.journal is not None):
+            self.save_state(self._snapshot_path)
+        return imported, skipped
+
+    @_reader
+    def export_tasks(self, file_path, kinds=KINDS):
+        """Streams tasks of the given kinds, archived ones included, to a CSV or JSON-lines file. Returns how many were written."""
+        try:
+            count = write_rows(file_path, ((kind, r) for kind in kinds for r in self.store.records(kind, ordered=True)))
+            print(f"Exported {count} tasks to {file_path}")
+            return count
+        except (OSError, ValueError) as e:
+            print(f"Error exporting tasks: {e}")
+            return 0
+
+    @_writer
+    def enable_journal(self, snapshot_path, journal_path, fsync_batch=32, fsync_interval=1.0):
+        """
+        Replays the operation journal on top of the state loaded from snapshot_path (call load_state first),
+        then journals every further change so a crash loses at most the last unsynced batch.
+        """
+        if self.store.persistent:
+            return # The store commits every change itself
+        journal = TaskJournal(journal_path, fsync_batch, fsync_interval)
+        replayed = journal.replay(self._apply_journal_entry, after_seq=self._snapshot_seq)
+        self._snapshot_path = snapshot_path
+        self.journal = journal
+        if replayed:
+            print(f"Replayed {replayed} journaled changes from {journal_path}")
+            self.save_state(snapshot_path) # Fold the replayed entries into a fresh snapshot and start an empty log
+        else:
+            journal.discard_rotated()
+            journal.open()
+
+    @_writer
+    def sync_state(self):
+        """
+        Periodic housekeeping: fsyncs a waiting journal batch, or writes changed bookkeeping to a persistent store,
+        and at most once per archive_roll_interval rolls old completed tasks out of memory.
+        """
+        now = time.time()
+        if now - self._last_archive_roll >= self.archive_roll_interval:
+            self._last_archive_roll = now
+            archived = self.store.roll_completed(int(now))
+            if archived:
+                # Journaled, so a restart from an older snapshot drops the same tasks from memory instead of archiving them again
+                self._log("archive", now=int(now))
+                print(f"Archived {archived} completed tasks.")
+        if self.journal is not None:
+            self.journal.sync_if_due()
+        elif self._meta_dirty:
+            self.store.save_meta(self._meta_dict())
+            self._meta_dirty = False
+
+    def _log(self, op, **fields):
+        if self.store.persistent:
+            self._meta_dirty = True # History/feedback/alert bookkeeping lives outside the task tables
+        if self.journal is None:
+            return
+        self.journal.append(op, **fields)
+        if self.journal.entries_since_snapshot >= self.journal_compact_threshold:
+            self.compact_journal()
+
+    @_writer
+    def compact_journal(self):
+        """Writes a fresh snapshot on a background thread and drops the journal entries it covers."""
+        if self.journal is None or (self._compaction_thread is not None and self._compaction_thread.is_alive()):
+            return
+        data = self.to_dict() # Taken on the calling thread, so it is consistent with the journal position
+        data["journal_seq"] = self.journal.seq
+        if not self.journal.rotate():
+            return
+        self._compaction_thread = threading.Thread(target=self._finish_compaction, args=(data,), daemon=True)
+        self._compaction_thread.start()
+
+    def _finish_compaction(self, data):
+        try:
+            self._write_snapshot(self._snapshot_path, data)
+            self.journal.discard_rotated()
+        except Exception as e:
+            print(f"Error compacting task journal: {e}")
+
+    def _apply_journal_entry(self, entry):
+        """Re-applies one journaled operation. Tasks are addressed by their timestamp key, as in the JSON file."""
+        op = entry["op"]
+        if op == "add":
+            self.add_task(entry["desc"], entry["ts"])
+        elif op == "schedule":
+            self.schedule_task(entry["desc"], datetime.strptime(entry["ts"], TIMESTAMP_FORMAT), entry["recurring"], entry["priority"])
+        elif op == "complete":
+            record = self.store.get(entry["source"], to_epoch(entry["ts"]))
+            if record:
+                self._complete_record(entry["source"], record, entry.get("at"))
+        elif op == "priority":
+            record = self.store.get("scheduled", to_epoch(entry["ts"]))
+            if record:
+                self.store.set_priority(record, entry["priority"])
+        elif op == "feedback":
+            self.record_feedback(entry["suggestion"], entry["feedback"])
+        elif op == "clear":
+            self.clear_tasks()
+        elif op == "archive":
+            self.store.roll_completed(entry["now"]) # The same completed tasks as originally; the archive already has them
+        elif op == "alert":
+            record = self.store.get("scheduled", to_epoch(entry["ts"]))
+            if record:
+                self._fire(record, entry["day"], entry["minute"], to_epoch(entry["next"]) if entry.get("next") else None)
+        else:
+            print(f"Warning: Unknown journal operation '{op}' skipped.")
@@ -0,0 +1,38 @@
+# task_record.py
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class TaskRecord:
+    """
+    Compact in-memory task. The timestamp is parsed once into epoch seconds and only
+    formatted back to a string for display and persistence.
+    For ad-hoc and completed tasks the timestamp is the creation time, for scheduled tasks it is the due time.
+    """
+    __slots__ = ("id", "desc", "timestamp", "recurring", "priority", "completed_at")
+
+    def __init__(self, task_id, desc, timestamp, recurring=False, priority=1, completed_at=None):
+        self.id = task_id # Stable integer ID, assigned by the task store
+        self.desc = desc
+        self.timestamp = timestamp # Epoch seconds (int)
+        self.recurring = recurring
+        self.priority = priority
+        self.completed_at = completed_at # Epoch seconds the task was completed, None while active
+
+    @property
+    def key(self):
+        """The 'YYYY-MM-DD HH:MM:SS' string used as the key in the JSON state file."""
+        return datetime.fromtimestamp(self.timestamp).strftime(TIMESTAMP_FORMAT)
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+    def __repr__(self):
+        return f"TaskRecord(id={self.id}, desc={self.desc!r}, key={self.key!r}, recurring={self.recurring}, priority={self.priority})"
+
+def to_epoch(value):
+    """Converts a datetime or a 'YYYY-MM-DD HH:MM:SS' string to epoch seconds. Raises ValueError on bad input."""
+    if isinstance(value, str):
+        value = datetime.strptime(value, TIMESTAMP_FORMAT)
+    return int(value.timestamp())
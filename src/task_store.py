@@ -0,0 +1,396 @@
+# task_store.py
+from contextlib import contextmanager
+import bisect
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+
+from recurrence import normalize_rule
+from task_archive import CompletedArchive
+from task_index import TrigramIndex
+from task_record import TaskRecord
+
+# Task kinds shared by every store: ad-hoc tasks, scheduled tasks and completed tasks.
+# Each kind holds at most one task per timestamp, as in the JSON state file.
+KINDS = ("tasks", "scheduled", "completed")
+
+class MemoryTaskStore:
+    """
+    Keeps every task in dicts (epoch seconds -> TaskRecord) with in-memory indexes:
+    a sorted due-time index for due checks and time windows, and trigram indexes for partial-match lookups.
+    It is not persistent by itself; TaskManager saves it as the JSON state file plus journal.
+    With an archive, completed tasks older than archive_after_days are rolled out of memory by roll_completed.
+    """
+    persistent = False
+
+    def __init__(self, archive=None, archive_after_days=7):
+        self.archive = archive # Optional CompletedArchive
+        self.archive_after_days = archive_after_days
+        self._collections = {kind: {} for kind in KINDS}
+        self._indexes = {"tasks": TrigramIndex(), "scheduled": TrigramIndex()} # Completed tasks are never looked up
+        self._due_order = [] # Sorted due epochs of scheduled tasks (one task per timestamp)
+        self.next_id = 1 # Saved in the state file, so IDs survive a reload and are never reused
+        self.version = 0 # Bumped on every change; cached sorted views are rebuilt when it moves
+        self._views = {} # kinds tuple -> (version, [(kind, record)], [timestamp]) in timestamp order
+        self._in_batch = False # While bulk loading, new due times are appended and sorted once at the end
+
+    @staticmethod
+    def _index_text(record):
+        # A newline never appears in a command, so no trigram spans both timestamp and description
+        return f"{record.key}\n{record.desc.lower()}"
+
+    def _insert(self, kind, record):
+        self.version += 1
+        collection = self._collections[kind]
+        index = self._indexes.get(kind)
+        replaced = collection.get(record.timestamp)
+        if replaced is not None and index is not None:
+            index.remove(replaced.timestamp, self._index_text(replaced))
+        collection[record.timestamp] = record
+        if index is not None:
+            index.add(record.timestamp, self._index_text(record))
+        if kind == "scheduled" and replaced is None:
+            if self._in_batch:
+                self._due_order.append(record.timestamp)
+            else:
+                bisect.insort(self._due_order, record.timestamp)
+
+    def add(self, kind, desc, timestamp, recurring=False, priority=1, completed_at=None, task_id=None):
+        """
+        Creates a task, replacing any task of the same kind at the same timestamp, and returns its record.
+        task_id restores a saved ID; otherwise the next unused one is assigned.
+        """
+        if task_id is None:
+            task_id = self.next_id
+        self.next_id = max(self.next_id, task_id + 1)
+        record = TaskRecord(task_id, desc, timestamp, normalize_rule(recurring), priority, completed_at)
+        self._insert(kind, record)
+        return record
+
+    def get(self, kind, timestamp):
+        return self._collections[kind].get(timestamp)
+
+    def find(self, kind, identifier):
+        """Returns the task whose timestamp or description contains identifier (lowercase) with the lowest ID."""
+        collection = self._collections[kind]
+        candidates = self._indexes[kind].candidates(identifier)
+        records = collection.values() if candidates is None else (collection[t] for t in candidates)
+        matches = [r for r in records if identifier in r.key or identifier in r.desc.lower()]
+        return min(matches, key=lambda r: r.id) if matches else None
+
+    def remove(self, kind, record):
+        self.version += 1
+        del self._collections[kind][record.timestamp]
+        index = self._indexes.get(kind)
+        if index is not None:
+            index.remove(record.timestamp, self._index_text(record))
+        if kind == "scheduled":
+            if self._in_batch:
+                self._due_order.remove(record.timestamp) # Not sorted until the batch ends
+            else:
+                del self._due_order[bisect.bisect_left(self._due_order, record.timestamp)]
+
+    def complete(self, kind, record, completed_at):
+        self.remove(kind, record)
+        record.completed_at = completed_at
+        self._insert("completed", record)
+
+    def set_priority(self, record, priority):
+        self.version += 1
+        record.priority = priority
+
+    def reschedule(self, record, timestamp):
+        self.remove("scheduled", record)
+        record.timestamp = timestamp
+        self._insert("scheduled", record)
+
+    def due(self, now):
+        """Scheduled tasks due at or before now, oldest first. Costs O(log n + k) for k due tasks."""
+        scheduled = self._collections["scheduled"]
+        return [scheduled[t] for t in self._due_order[:bisect.bisect_right(self._due_order, now)]]
+
+    def due_between(self, start, end):
+        """Scheduled tasks with start < due <= end, answered from the due-time index."""
+        scheduled = self._collections["scheduled"]
+        low = bisect.bisect_right(self._due_order, start)
+        high = bisect.bisect_right(self._due_order, end)
+        return [scheduled[t] for t in self._due_order[low:high]]
+
+    def records(self, kind, ordered=False, include_archived=True):
+        """Tasks of one kind, sorted by timestamp if ordered. Archived completed tasks are streamed in after the resident ones."""
+        collection = self._collections[kind]
+        resident = [r for _, r in self._sorted_view((kind,))[1]] if ordered else list(collection.values())
+        if kind != "completed" or self.archive is None or not include_archived:
+            return resident
+        # A resident task replaces an archived one with the same timestamp
+        archived = (r for r in self.archive.records() if r.timestamp not in collection)
+        if ordered:
+            return heapq.merge(archived, resident, key=lambda r: r.timestamp)
+        return itertools.chain(resident, archived)
+
+    def _sorted_view(self, kinds):
+        """Resident tasks of the given kinds in timestamp order, cached until the next change."""
+        view = self._views.get(kinds)
+        if view is None or view[0] != self.version:
+            items = sorted((r.timestamp, r.id, kind, r) for kind in kinds for r in self._collections[kind].values())
+            view = (self.version, [(kind, r) for _, _, kind, r in items], [t for t, _, _, _ in items])
+            self._views[kinds] = view
+        return view
+
+    def page(self, kinds, offset, limit, start=None, end=None):
+        """
+        Returns ([(kind, record)], total) for one page of the given kinds with start <= timestamp < end,
+        in timestamp order. Only the page itself is copied out of the cached view.
+        """
+        if kinds == ("completed",) and self.archive is not None and start is None and end is None:
+            # Archived tasks are streamed, one segment at a time, up to the end of the page
+            stream = self.records("completed", ordered=True)
+            return [("completed", r) for r in itertools.islice(stream, offset, offset + limit)], self.count("completed")
+        _, items, timestamps = self._sorted_view(kinds)
+        low = 0 if start is None else bisect.bisect_left(timestamps, start)
+        high = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+        return items[low + offset:min(high, low + offset + limit)], high - low
+
+    def count(self, kind):
+        if kind == "completed" and self.archive is not None:
+            return len(self._collections[kind]) + self.archive.count()
+        return len(self._collections[kind])
+
+    def roll_completed(self, now):
+        """Moves completed tasks finished more than archive_after_days ago into the archive. Returns how many moved."""
+        if self.archive is None:
+            return 0
+        cutoff = now - self.archive_after_days * 24 * 3600
+        completed = self._collections["completed"]
+        old = [r for r in completed.values() if (r.completed_at or r.timestamp) < cutoff]
+        if old:
+            self.version += 1
+            self.archive.append(old)
+            for record in old:
+                del completed[record.timestamp]
+        return len(old)
+
+    @contextmanager
+    def batch(self):
+        """Groups a bulk load: the due-time index is sorted once at the end instead of on every insert."""
+        if self._in_batch:
+            yield
+            return
+        self._in_batch = True
+        try:
+            yield
+        finally:
+            self._in_batch = False
+            self._due_order.sort()
+
+    def clear(self, include_archived=True):
+        self.version += 1
+        for collection in self._collections.values():
+            collection.clear()
+        for index in self._indexes.values():
+            index.clear()
+        self._due_order.clear()
+        if self.archive is not None and include_archived:
+            self.archive.clear()
+
+    def close(self):
+        pass
+
+class SqliteTaskStore:
+    """
+    Keeps tasks in an SQLite database, indexed on due time, priority and completion time,
+    so due checks, suggestion windows and sorted listings become indexed queries and
+    nothing but the rows being looked at is held in Python. Every change is committed immediately.
+    Partial-match lookups use an FTS5 trigram table when the SQLite build has one.
+    """
+    persistent = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            desc TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            recurring NOT NULL DEFAULT 0, -- 0, or a rule string such as 'weekly' (1 from older databases means daily)
+            priority INTEGER NOT NULL DEFAULT 1,
+            completed_at INTEGER
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_kind_ts ON tasks(kind, ts);
+        CREATE INDEX IF NOT EXISTS idx_tasks_kind_priority ON tasks(kind, priority);
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks(completed_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_ts ON tasks(ts);
+        CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+    COLUMNS = "id, desc, ts, recurring, priority, completed_at"
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # TaskManager serializes writers behind its own lock; readers may share the connection from other threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(text, tokenize='trigram')")
+            self._fts = True
+        except sqlite3.OperationalError:
+            print("Warning: SQLite has no FTS5 trigram tokenizer; task lookups will scan.")
+            self._fts = False
+        self._conn.commit()
+        self._in_batch = False
+
+    @staticmethod
+    def _row_to_record(row):
+        task_id, desc, ts, recurring, priority, completed_at = row
+        return TaskRecord(task_id, desc, ts, normalize_rule(recurring), priority, completed_at)
+
+    def _commit(self):
+        if not self._in_batch:
+            self._conn.commit()
+
+    @contextmanager
+    def batch(self):
+        """Groups many changes into a single transaction."""
+        self._in_batch = True
+        try:
+            yield
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        finally:
+            self._in_batch = False
+
+    def _index(self, record):
+        if self._fts:
+            self._conn.execute("INSERT INTO task_search(rowid, text) VALUES (?, ?)", (record.id, f"{record.key}\n{record.desc.lower()}"))
+
+    def _unindex(self, task_id):
+        if self._fts:
+            self._conn.execute("DELETE FROM task_search WHERE rowid = ?", (task_id,))
+
+    def _delete_at(self, kind, timestamp):
+        row = self._conn.execute("SELECT id FROM tasks WHERE kind = ? AND ts = ?", (kind, timestamp)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM tasks WHERE id = ?", row)
+            self._unindex(row[0])
+
+    def add(self, kind, desc, timestamp, recurring=False, priority=1, completed_at=None, task_id=None):
+        recurring = normalize_rule(recurring)
+        self._delete_at(kind, timestamp)
+        cursor = self._conn.execute( # A NULL id is assigned by AUTOINCREMENT
+            "INSERT INTO tasks (id, kind, desc, ts, recurring, priority, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, kind, desc, timestamp, recurring or 0, priority, completed_at))
+        record = TaskRecord(cursor.lastrowid, desc, timestamp, recurring, priority, completed_at)
+        if kind != "completed":
+            self._index(record)
+        self._commit()
+        return record
+
+    def get(self, kind, timestamp):
+        row = self._conn.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE kind = ? AND ts = ?", (kind, timestamp)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def find(self, kind, identifier):
+        if self._fts and len(identifier) >= 3:
+            row = self._conn.execute(
+                f"SELECT {', '.join('t.' + c for c in self.COLUMNS.split(', '))} FROM task_search s JOIN tasks t ON t.id = s.rowid "
+                "WHERE s.text MATCH ? AND t.kind = ? ORDER BY t.id LIMIT 1",
+                ('"' + identifier.replace('"', '""') + '"', kind)).fetchone()
+        else:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM tasks WHERE kind = ? AND "
+                "(instr(lower(desc), ?) > 0 OR instr(strftime('%Y-%m-%d %H:%M:%S', ts, 'unixepoch', 'localtime'), ?) > 0) "
+                "ORDER BY id LIMIT 1", (kind, identifier, identifier)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def remove(self, kind, record):
+        self._conn.execute("DELETE FROM tasks WHERE id = ?", (record.id,))
+        self._unindex(record.id)
+        self._commit()
+
+    def complete(self, kind, record, completed_at):
+        self._delete_at("completed", record.timestamp)
+        self._conn.execute("UPDATE tasks SET kind = 'completed', completed_at = ? WHERE id = ?", (completed_at, record.id))
+        self._unindex(record.id)
+        record.completed_at = completed_at
+        self._commit()
+
+    def set_priority(self, record, priority):
+        self._conn.execute("UPDATE tasks SET priority = ? WHERE id = ?", (priority, record.id))
+        record.priority = priority
+        self._commit()
+
+    def reschedule(self, record, timestamp):
+        self._delete_at("scheduled", timestamp)
+        self._conn.execute("UPDATE tasks SET ts = ? WHERE id = ?", (timestamp, record.id))
+        self._unindex(record.id)
+        record.timestamp = timestamp
+        self._index(record)
+        self._commit()
+
+    def due(self, now):
+        rows = self._conn.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE kind = 'scheduled' AND ts <= ? ORDER BY ts", (now,))
+        return [self._row_to_record(row) for row in rows]
+
+    def due_between(self, start, end):
+        rows = self._conn.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE kind = 'scheduled' AND ts > ? AND ts <= ? ORDER BY ts", (start, end))
+        return [self._row_to_record(row) for row in rows]
+
+    def records(self, kind, ordered=False, include_archived=True):
+        order = " ORDER BY ts" if ordered else ""
+        rows = self._conn.execute(f"SELECT {self.COLUMNS} FROM tasks WHERE kind = ?{order}", (kind,))
+        return (self._row_to_record(row) for row in rows)
+
+    def page(self, kinds, offset, limit, start=None, end=None):
+        """Same contract as MemoryTaskStore.page, answered by the (kind, ts) index with LIMIT/OFFSET."""
+        where = f"kind IN ({', '.join('?' for _ in kinds)})"
+        params = list(kinds)
+        if start is not None:
+            where += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            where += " AND ts < ?"
+            params.append(end)
+        total = self._conn.execute(f"SELECT COUNT(*) FROM tasks WHERE {where}", params).fetchone()[0]
+        rows = self._conn.execute(f"SELECT kind, {self.COLUMNS} FROM tasks WHERE {where} ORDER BY ts, id LIMIT ? OFFSET ?",
+                                  params + [limit, offset])
+        return [(row[0], self._row_to_record(row[1:])) for row in rows], total
+
+    def roll_completed(self, now):
+        return 0 # Completed rows already live on disk and are only read when listed
+
+    def count(self, kind):
+        return self._conn.execute("SELECT COUNT(*) FROM tasks WHERE kind = ?", (kind,)).fetchone()[0]
+
+    @property
+    def next_id(self):
+        row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        return (row[0] if row else 0) + 1
+
+    def clear(self, include_archived=True):
+        self._conn.execute("DELETE FROM tasks")
+        if self._fts:
+            self._conn.execute("DELETE FROM task_search")
+        self._commit()
+
+    def load_meta(self):
+        """Returns the small non-task state (history, feedback, alert bookkeeping) saved with save_meta."""
+        return {name: json.loads(value) for name, value in self._conn.execute("SELECT name, value FROM meta")}
+
+    def save_meta(self, meta):
+        self._conn.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                               [(name, json.dumps(value)) for name, value in meta.items()])
+        self._commit()
+
+    def close(self):
+        self._conn.close()
+
+def create_task_store(backend, sqlite_path=None, archive_dir=None, archive_after_days=7):
+    """Builds the task store named in config.TASK_STORE ("json" or "sqlite")."""
+    if backend == "sqlite":
+        return SqliteTaskStore(sqlite_path)
+    return MemoryTaskStore(CompletedArchive(archive_dir) if archive_dir else None, archive_after_days)
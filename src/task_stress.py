@@ -0,0 +1,101 @@
+# task_stress.py
+"""
+Stress run for TaskManager's locking: N writer threads add, schedule, complete and reschedule tasks while
+M reader threads list, count and snapshot them, on both task stores. Readers check that no snapshot ever
+shows a task both open and completed; at the end every added task must be accounted for, and the state
+must reload (snapshot + journal, or the database) to exactly what was in memory, task IDs included.
+Run from src/: python task_stress.py [writers] [readers] [operations per thread]
+"""
+from datetime import datetime, timedelta
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from task_manager import TaskManager
+from task_store import create_task_store
+
+COMPARED = ("tasks", "scheduled_tasks", "completed_tasks", "task_ids", "task_history", "feedback_history")
+
+def open_manager(backend, directory):
+    manager = TaskManager(create_task_store(backend, os.path.join(directory, "tasks.db"), os.path.join(directory, "archive"), 7))
+    manager.load_state(os.path.join(directory, "tasks.json"))
+    manager.enable_journal(os.path.join(directory, "tasks.json"), os.path.join(directory, "tasks.journal"))
+    return manager
+
+def writer(manager, number, operations, start, added, errors):
+    try:
+        for i in range(operations):
+            timestamp = start + timedelta(seconds=number * 1000000 + i)
+            if i % 3 == 0:
+                manager.schedule_task(f"w{number} s{i}", timestamp - timedelta(days=1), "daily" if i % 2 == 0 else False, 2)
+            else:
+                manager.add_task(f"w{number} t{i}", timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+                added.append(f"w{number} t{i}")
+            if i % 10 == 0:
+                manager.complete_task(f"w{number} t{i - 1}")
+            if i % 25 == 0:
+                manager.check_and_update_scheduled_tasks()
+            if i % 40 == 0:
+                manager.record_feedback(f"w{number} t{i - 1}", 1)
+    except Exception as e:
+        errors.append(f"writer {number}: {e!r}")
+
+def reader(manager, operations, errors):
+    try:
+        for i in range(operations):
+            snapshot = manager.to_dict()
+            both = set(snapshot["tasks"].values()) & set(snapshot["completed_tasks"].values())
+            if both:
+                errors.append(f"reader saw tasks both open and completed: {sorted(both)[:3]}")
+                return
+            manager.get_tasks_page(1, 10)
+            manager.task_count()
+            manager.suggest_task()
+            if i % 50 == 0:
+                manager.get_all_tasks_display()
+    except Exception as e:
+        errors.append(f"reader: {e!r}")
+
+def run(backend, writers, readers, operations):
+    directory = tempfile.mkdtemp(prefix=f"task_stress_{backend}_")
+    try:
+        manager = open_manager(backend, directory)
+        manager.journal_compact_threshold = 50 # Compact often, so snapshots race with writers too
+        start, added, errors = datetime.now(), [], []
+        threads = [threading.Thread(target=writer, args=(manager, n, operations, start, added, errors)) for n in range(writers)]
+        threads += [threading.Thread(target=reader, args=(manager, operations, errors)) for _ in range(readers)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        state = manager.to_dict()
+        seen = set(state["tasks"].values()) | set(state["completed_tasks"].values())
+        missing = [desc for desc in added if desc not in seen]
+        if missing:
+            errors.append(f"{len(missing)} added task(s) lost, e.g. {missing[:3]}")
+        manager.save_state(os.path.join(directory, "tasks.json"))
+        manager.store.close()
+        reloaded = open_manager(backend, directory).to_dict()
+        for key in COMPARED:
+            if reloaded.get(key) != state.get(key):
+                errors.append(f"reloaded {key} differs from memory")
+        print(f"{backend}: {writers} writers, {readers} readers, {operations} operations each in {elapsed:.2f}s, "
+              f"{sum(len(state[k]) for k in ('tasks', 'scheduled_tasks', 'completed_tasks'))} tasks: {'OK' if not errors else 'FAILED'}")
+        for error in errors[:10]:
+            print(f"  {error}")
+        return not errors
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main(writers=4, readers=4, operations=300):
+    results = [run(backend, writers, readers, operations) for backend in ("json", "sqlite")]
+    return 0 if all(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:4])))
@@ -0,0 +1,77 @@
+# time_phrases.py
+from collections import OrderedDict
+import re
+import threading
+
+from dateutil.parser import parse, ParserError
+
+# Hand-written formats (from agent_CLD's parse_time), tried before anything else: "14:30", "2:30 pm", "9am", "9.30 pm".
+# The bare-hour pattern must not start right after a digit, '.' or ':', or it would read the minutes of "3.15pm" as an hour.
+FAST_PATTERNS = [re.compile(p) for p in (r"(\d{1,2}):(\d{2})\s*(am|pm)?", r"(?<![\d.:])(\d{1,2})\s*(am|pm)", r"(\d{1,2})\.(\d{2})\s*(am|pm)?")]
+
+def normalize_phrase(phrase):
+    return " ".join(phrase.lower().split())
+
+def fast_parse(phrase):
+    """Resolves the common clock formats to 'HH:MM' with plain regexes, or returns None."""
+    for pattern in FAST_PATTERNS:
+        match = pattern.search(phrase)
+        if match:
+            groups = match.groups()
+            hour = int(groups[0])
+            minute = int(groups[1]) if len(groups) > 1 and groups[1] and groups[1].isdigit() else 0
+            suffix = groups[-1] if groups[-1] in ("am", "pm") else None
+            if suffix == "pm" and hour != 12:
+                hour += 12
+            elif suffix == "am" and hour == 12:
+                hour = 0
+            if 0 <= hour <= 23 and 0 <= minute <= 59:
+                return f"{hour:02d}:{minute:02d}"
+    return None
+
+class TimePhraseCache:
+    """
+    Turns a time phrase into 'HH:MM' (None if it cannot be understood): the regex fast path first,
+    then a bounded LRU cache of earlier dateutil results, and dateutil's fuzzy parser only on a miss.
+    Phrases are normalized (lowercase, single spaces) so "9 AM" and "9  am" share an entry.
+    """
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.fast = 0 # Phrases answered by the regex fast path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # Normalized phrase -> 'HH:MM' or None, least recently used first
+        self._lock = threading.Lock()
+
+    def resolve(self, phrase):
+        phrase = normalize_phrase(phrase)
+        resolved = fast_parse(phrase)
+        if resolved is not None:
+            self.fast += 1
+            return resolved
+        with self._lock:
+            if phrase in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(phrase)
+                return self._entries[phrase]
+            self.misses += 1
+        try:
+            resolved = parse(phrase, fuzzy=True).strftime("%H:%M")
+        except (ParserError, ValueError, OverflowError):
+            resolved = None # Unparseable phrases are cached too, so repeating one stays cheap
+        with self._lock:
+            self._entries[phrase] = resolved
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return resolved
+
+    def stats(self):
+        return {"fast": self.fast, "hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.fast = self.hits = self.misses = 0
+
+# Shared by every parser in the process
+TIME_PHRASES = TimePhraseCache()
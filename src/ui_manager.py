@@ -1,4 +1,7 @@
 # ui_manager.py
+import itertools
+import queue
+
 import pygame
 from config import SCREEN_WIDTH, SCREEN_HEIGHT, FONT_SIZE, TEXT_COLOR, BACKGROUND_COLOR, \
                    AGENT_COLOR_IDLE, AGENT_COLOR_GREETING, AGENT_COLOR_EXITING, AGENT_COLOR_ALERT, \
@@ -7,7 +10,11 @@ from config import SCREEN_WIDTH, SCREEN_HEIGHT, FONT_SIZE, TEXT_COLOR, BACKGROUN
 class UIManager:
     def __init__(self, max_response_lines):
         self.max_response_lines = max_response_lines
-        self.response_display = []
+        self.response_display = [] # Lines on screen, rebuilt from _responses
+        self._responses = [] # One [text] per response, oldest first; a stream's text grows in place
+        self._streams = {} # Stream id -> its entry in _responses, while the stream is open
+        self._stream_ids = itertools.count(1)
+        self._pending_responses = queue.SimpleQueue() # (stream id or None, text, ending) from any thread; applied on the UI thread
         self._input_buffer = "" # Renamed to private to manage internally
         self.expanded = False
         self.screen = None  # Will be set by set_screen
@@ -47,12 +54,50 @@ class UIManager:
     def clear_input_buffer(self):
         self._input_buffer = ""
 
-    def add_response(self, response):
-        for line in response.split('\n'):
-            self.response_display.append(line)
+    def add_response(self, response, stream=None):
+        """
+        Adds a response on new lines; with stream (from start_stream) the text continues that stream's response
+        instead, wherever it is on screen. Safe to call from any thread: text is queued and only reaches
+        response_display on the UI thread, in visualize.
+        """
+        self._pending_responses.put((stream, response, False))
+
+    def start_stream(self, response=""):
+        """Starts a response that later text is added to with add_response(text, stream=...); returns the stream id."""
+        stream = next(self._stream_ids)
+        self._pending_responses.put((stream, response, False))
+        return stream
+
+    def end_stream(self, stream):
+        self._pending_responses.put((stream, "", True))
+
+    def _apply_pending_responses(self):
+        changed = False
+        while True:
+            try:
+                stream, response, ending = self._pending_responses.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            entry = self._streams.get(stream)
+            if ending:
+                self._streams.pop(stream, None)
+            elif entry is not None:
+                entry[0] += response
+            else:
+                entry = [response]
+                self._responses.append(entry)
+                if stream is not None:
+                    self._streams[stream] = entry
+        if not changed:
+            return
+        lines = [line for entry in self._responses for line in entry[0].split('\n')]
         # Keep only the last max_response_lines
-        if len(self.response_display) > self.max_response_lines:
-            self.response_display = self.response_display[-self.max_response_lines:]
+        while len(self._responses) > 1 and len(lines) - self._responses[0][0].count('\n') - 1 >= self.max_response_lines:
+            lines = lines[self._responses[0][0].count('\n') + 1:]
+            dropped = self._responses.pop(0)
+            self._streams = {stream: entry for stream, entry in self._streams.items() if entry is not dropped}
+        self.response_display = lines[-self.max_response_lines:]
 
     def toggle_expanded(self):
         self.expanded = not self.expanded
@@ -64,6 +109,8 @@ class UIManager:
             print("UIManager: Screen or Font not initialized for visualization.")
             return
 
+        self._apply_pending_responses()
+
         # Always draw to the current screen size. The main loop is responsible for set_mode on resize.
         width, height = self.screen.get_size()
 